@@ -0,0 +1,40 @@
+from __future__ import annotations
+import sys
+
+USAGE = """usage: python -m app <command> [options]
+
+commands:
+  review   Review a directory or manifest of .docx bundles (see: python -m app review -h)
+  index    Re-sync the reference index with REFERENCE_DIR
+  serve    Run the HTTP review service: serve [--host 127.0.0.1] [--port 8000]
+"""
+
+
+def main(argv: list[str]) -> int:
+    if not argv or argv[0] in ("-h", "--help"):
+        print(USAGE)
+        return 0 if argv else 2
+    command, rest = argv[0], argv[1:]
+    if command == "review":
+        from app.batch import main as review_main
+        return review_main(rest)
+    if command == "index":
+        from app.ingest import refresh_index
+        print(refresh_index())
+        return 0
+    if command == "serve":
+        import argparse
+        import uvicorn  # type: ignore
+        from app.service import create_app
+        parser = argparse.ArgumentParser(prog="python -m app serve")
+        parser.add_argument("--host", default="127.0.0.1")
+        parser.add_argument("--port", type=int, default=8000)
+        args = parser.parse_args(rest)
+        uvicorn.run(create_app(), host=args.host, port=args.port)
+        return 0
+    print(USAGE, file=sys.stderr)
+    return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,108 +1,229 @@
 from __future__ import annotations
-import re
-from typing import List, Dict, Any, Tuple
+import queue
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Iterator, List, Dict, Any, Tuple
 from pathlib import Path
 
-from app.classifier import classify
-from app.checklists import REQUIRED_DOCS_BY_PROCESS, detect_process_from_docs
-from app.retrieval import retrieve_context, build_rag_prompt
-from app.llm import LLMClient
-from app.official_check import is_official_adgm_format
+from app.config import load_config
+from app.checklists import REQUIRED_DOCS_BY_PROCESS, detect_process_from_docs, partition_for
+from app.retrieval import retrieve_context, retrieve_for_document, build_rag_prompt
+from app.llm import get_llm_client
+from app.coalesce import CoalescingCache, request_key, shared_llm_cache
+from app.json_stream import JSONArrayStream
+from app.rules import classify_from_scan, official_from_scan, red_flags_from_scan, scan_document
+from app import tracing
 
 
 def detect_basic_red_flags(text: str) -> List[Dict[str, Any]]:
-    issues: List[Dict[str, Any]] = []
-    # Jurisdiction mentions not ADGM
-    if re.search(r"Dubai Courts|UAE Federal Courts|onshore UAE", text, re.I):
-        issues.append({
-            "issue": "Document references non-ADGM jurisdiction",
-            "section_hint": "Jurisdiction/Dispute Resolution",
-            "severity": "High",
-            "suggestion": "Specify ADGM Courts or ADGM Arbitration as applicable.",
-        })
-    # Ambiguous language
-    if re.search(r"may\s+at its discretion|best efforts|endeavour to", text, re.I):
-        issues.append({
-            "issue": "Ambiguous or non-binding language detected",
-            "section_hint": "Obligations/Definitions",
-            "severity": "Medium",
-            "suggestion": "Replace with clear, binding obligations (e.g., 'shall').",
-        })
-    # Missing signatures
-    if not re.search(r"Signed by|Signature|Authorised Signatory|Director", text, re.I):
-        issues.append({
-            "issue": "No signatory/signature section detected",
-            "section_hint": "Execution/Signatures",
+    return red_flags_from_scan(scan_document(text))
+
+
+def _local_checks(path: str, text: str) -> Dict[str, Any]:
+    # CPU-only stage (classification + regex checks); module-level so it can run in a process pool
+    # One memoized rule scan feeds classification, format check and red flags
+    with tracing.span("rules.scan", chars=len(text)) as attrs:
+        scan = scan_document(text, Path(path).name)
+        attrs["hits"] = len(scan.hits)
+    with tracing.span("classify"):
+        doc_type, confidence = classify_from_scan(scan)
+
+    # Official ADGM format check
+    with tracing.span("official_check"):
+        is_official, reason = official_from_scan(scan)
+    format_issue: List[Dict[str, Any]] = []
+    if not is_official:
+        format_issue.append({
+            "issue": "Document does not appear to be in official ADGM format",
+            "section_hint": "Formatting/Template",
             "severity": "High",
-            "suggestion": "Add execution blocks for authorised signatories.",
+            "suggestion": (
+                "Please use the official ADGM template as per ADGM rules and regulations. "
+                "Download the correct form from the official ADGM website."
+            ),
+            "citation": "ADGM official forms/templates (see ADGM Registration Authority).",
         })
-    return issues
+    return {
+        "file": Path(path).name,
+        "type": doc_type,
+        "confidence": confidence,
+        "issues": format_issue + red_flags_from_scan(scan),
+    }
+
 
+def _normalize_issue(item: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "section_hint": item.get("section_hint") or "",
+        "issue": item.get("issue") or "",
+        "severity": item.get("severity") or "Medium",
+        "suggestion": item.get("suggestion") or "",
+        "citation": item.get("citation") or "",
+    }
 
-def analyze_documents(docs: List[Tuple[str, str]]) -> Dict[str, Any]:
-    # docs: list of (path, text)
-    detected_types: List[str] = []
-    per_doc_results: List[Dict[str, Any]] = []
 
-    for path, text in docs:
-        doc_type, confidence = classify(path, text)
-
-        # Official ADGM format check
-        is_official, reason = is_official_adgm_format(text)
-        format_issue: List[Dict[str, Any]] = []
-        if not is_official:
-            format_issue.append({
-                "issue": "Document does not appear to be in official ADGM format",
-                "section_hint": "Formatting/Template",
-                "severity": "High",
-                "suggestion": (
-                    "Please use the official ADGM template as per ADGM rules and regulations. "
-                    "Download the correct form from the official ADGM website."
-                ),
-                "citation": "ADGM official forms/templates (see ADGM Registration Authority).",
-            })
-
-        base_issues = detect_basic_red_flags(text)
-        rag_contexts = retrieve_context(
-            f"Identify ADGM compliance red flags for a {doc_type} and cite rules.")
-        prompt = build_rag_prompt(
-            user_task=(
-                f"Document type: {doc_type}. Provide a short list of issues with citations and suggestions.\n"
-                f"Use JSON with fields: section_hint, issue, severity (High/Medium/Low), suggestion, citation."
-            ),
-            contexts=rag_contexts,
-        )
-        ai_issues: List[Dict[str, Any]] = []
+class PartialCompletion(Exception):
+    # Raised when the LLM stream breaks off; carries the issues parsed before the failure
+    def __init__(self, issues: List[Dict[str, Any]], cause: Exception) -> None:
+        super().__init__(str(cause))
+        self.issues = issues
+
+
+IssueCallback = Callable[[Dict[str, Any]], None]
+
+
+def _ai_issues(doc_type: str, text: str, retrieval_cache: CoalescingCache, llm_cache: CoalescingCache,
+               shared_cache: CoalescingCache | None = None, on_issue: IssueCallback | None = None,
+               retrieval_mode: str = "type", partition: str = "") -> List[Dict[str, Any]]:
+    # I/O-bound stage: retrieval + LLM round trip. In "type" mode both depend only on doc_type,
+    # so identical calls within a run (and, with a shared cache, across runs) are made once.
+    # "document" mode grounds retrieval in the document's own clauses instead. Retrieval only
+    # searches the reference partition the bundle's process is routed to.
+    user_task = (
+        f"Document type: {doc_type}. Provide a short list of issues with citations and suggestions.\n"
+        f"Use JSON with fields: section_hint, issue, severity (High/Medium/Low), suggestion, citation."
+    )
+    streamed: List[Dict[str, Any]] = []
+    ai_issues: List[Dict[str, Any]] = []
+    failure = "retrieval_failed"
+    try:
+        with tracing.span("retrieval", mode=retrieval_mode, partition=partition or "default") as attrs:
+            if retrieval_mode == "document":
+                rag_contexts = retrieval_cache.get_or_compute(
+                    request_key("retrieve_document", text, partition),
+                    lambda: retrieve_for_document(text, partition=partition))
+                user_task += ("\nWhere an issue concerns a document clause listed with a quoted heading, copy that "
+                              "heading exactly into section_hint; do not invent clause numbers.")
+            else:
+                query = f"Identify ADGM compliance red flags for a {doc_type} and cite rules."
+                rag_contexts = retrieval_cache.get_or_compute(request_key("retrieve", query, partition),
+                                                             lambda: retrieve_context(query, partition=partition))
+            attrs["contexts"] = len(rag_contexts)
+        prompt = build_rag_prompt(user_task=user_task, contexts=rag_contexts)
+        failure = "llm_failed"
+        llm = get_llm_client()
+        messages = [
+            {"role": "system", "content": "Return only valid JSON array."},
+            {"role": "user", "content": prompt},
+        ]
+        key = request_key("generate", llm.model_name, messages, 0.1, 700)
+
+        def call() -> List[Dict[str, Any]]:
+            # Parse while the completion streams: issues surface as soon as each object closes
+            # and a truncated answer still keeps everything completed before the cut.
+            parser = JSONArrayStream()
+            try:
+                for piece in llm.generate_stream(messages, temperature=0.1, max_tokens=700):
+                    for item in parser.feed(piece):
+                        issue = _normalize_issue(item)
+                        streamed.append(issue)
+                        if on_issue is not None:
+                            on_issue(dict(issue))
+            except Exception as e:
+                if streamed:
+                    tracing.drop("llm_stream_interrupted", kept=len(streamed), error=f"{type(e).__name__}: {e}")
+                    raise PartialCompletion(list(streamed), e)
+                raise
+            finally:
+                tracing.count("json.items", len(streamed))
+                if parser.errors:
+                    tracing.drop("invalid_json_item", count=parser.errors)
+                if parser.truncated:
+                    tracing.drop("truncated_json_array", kept=len(streamed))
+            return list(streamed)
+
         try:
-            llm = LLMClient()
-            llm_output = llm.generate([
-                {"role": "system", "content": "Return only valid JSON array."},
-                {"role": "user", "content": prompt},
-            ], temperature=0.1, max_tokens=700)
-            import json
-            parsed = json.loads(llm_output)
-            if isinstance(parsed, list):
-                for item in parsed:
-                    ai_issues.append({
-                        "section_hint": item.get("section_hint") or "",
-                        "issue": item.get("issue") or "",
-                        "severity": item.get("severity") or "Medium",
-                        "suggestion": item.get("suggestion") or "",
-                        "citation": item.get("citation") or "",
-                    })
-        except Exception:
-            ai_issues = []
-
-        issues = format_issue + base_issues + ai_issues
-        per_doc_results.append({
-            "file": Path(path).name,
-            "type": doc_type,
-            "confidence": confidence,
-            "issues": issues,
-        })
-        detected_types.append(doc_type)
+            if shared_cache is not None:
+                issues = llm_cache.get_or_compute(key, lambda: shared_cache.get_or_compute(key, call))
+            else:
+                issues = llm_cache.get_or_compute(key, call)
+        except PartialCompletion as e:
+            issues = e.issues
+        ai_issues = [dict(i) for i in issues]
+        if on_issue is not None and not streamed:
+            # Served from cache / another document's in-flight call: emit now
+            for issue in ai_issues:
+                on_issue(dict(issue))
+    except Exception as e:
+        # Whatever was parsed before the failure is kept; the rest is recorded as dropped
+        tracing.drop(failure, kept=len(streamed), error=f"{type(e).__name__}: {e}")
+        ai_issues = [dict(i) for i in streamed]
+    return ai_issues
+
+
+def _local_checks_in_worker(path: str, text: str) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    # Runs in a pool process: spans go to a detached trace that the parent merges back
+    with tracing.capture("local_checks") as tr:
+        with tracing.document(Path(path).name):
+            result = _local_checks(path, text)
+    return result, tr.state()
+
+
+def _run_local_checks(docs: List[Tuple[str, str]], process_workers: int) -> List[Dict[str, Any]]:
+    if process_workers > 0 and len(docs) > 1:
+        with ProcessPoolExecutor(max_workers=min(process_workers, len(docs))) as pool:
+            done = list(pool.map(_local_checks_in_worker, [p for p, _ in docs], [t for _, t in docs]))
+        for _result, state in done:
+            tracing.merge(state)
+        return [result for result, _state in done]
+    results = []
+    for path, text in docs:
+        with tracing.document(Path(path).name):
+            results.append(_local_checks(path, text))
+    return results
+
+
+def analyze_documents(docs: List[Tuple[str, str]], concurrency: int | None = None,
+                      on_issue: Callable[[int, Dict[str, Any]], None] | None = None,
+                      cancel: threading.Event | None = None) -> Dict[str, Any]:
+    # docs: list of (path, text); on_issue(doc_index, issue) is called as each issue is found.
+    # Setting `cancel` skips the AI stage of documents that have not started it yet.
+    # The report's "timing" section summarizes the trace of this review (see app.tracing).
+    with tracing.trace("review") as tr:
+        report = _analyze_documents(docs, concurrency, on_issue, cancel)
+        for cache_name, stats in report["cache"].items():
+            for key in ("hits", "misses", "coalesced"):
+                if key in stats:
+                    tracing.count(f"cache.{cache_name}.{key}", stats[key])
+    report["timing"] = tr.summary()
+    return report
+
 
+def _analyze_documents(docs: List[Tuple[str, str]], concurrency: int | None,
+                       on_issue: Callable[[int, Dict[str, Any]], None] | None,
+                       cancel: threading.Event | None) -> Dict[str, Any]:
+    cfg = load_config()
+    concurrency = max(1, concurrency or cfg.review_concurrency)
+    per_doc_results = _run_local_checks(docs, cfg.review_process_workers)
+    if on_issue is not None:
+        for i, result in enumerate(per_doc_results):
+            for issue in result["issues"]:
+                on_issue(i, dict(issue))
+    retrieval_cache = CoalescingCache()
+    llm_cache = CoalescingCache()
+    shared_cache = shared_llm_cache(cfg.llm_cache_ttl) if cfg.llm_cache_ttl > 0 else None
+    shared_before = shared_cache.stats() if shared_cache is not None else None
+    # The process is known from the local checks alone, so retrieval can be routed up front
+    detected_types: List[str] = [r["type"] for r in per_doc_results]
     process = detect_process_from_docs(detected_types)
+
+    # Retrieval + LLM calls overlap across documents; map() keeps the upload order
+    if per_doc_results:
+        @tracing.propagate
+        def stage(i: int) -> List[Dict[str, Any]]:
+            if cancel is not None and cancel.is_set():
+                tracing.drop("cancelled", document=per_doc_results[i]["file"])
+                return []
+            callback = (lambda issue: on_issue(i, issue)) if on_issue is not None else None
+            with tracing.document(per_doc_results[i]["file"]):
+                doc_type = per_doc_results[i]["type"]
+                return _ai_issues(doc_type, docs[i][1], retrieval_cache, llm_cache, shared_cache, callback,
+                                  retrieval_mode=cfg.retrieval_mode, partition=partition_for(process, doc_type))
+
+        with ThreadPoolExecutor(max_workers=min(concurrency, len(per_doc_results))) as pool:
+            all_ai_issues = list(pool.map(stage, range(len(per_doc_results))))
+        for result, ai_issues in zip(per_doc_results, all_ai_issues):
+            result["issues"] = result["issues"] + ai_issues
+
     required = REQUIRED_DOCS_BY_PROCESS.get(process, [])
     present_set = set(dt for dt in detected_types if dt != "Unknown")
     missing = [d for d in required if d not in present_set]
@@ -113,5 +234,42 @@ def analyze_documents(docs: List[Tuple[str, str]]) -> Dict[str, Any]:
         "required_documents": len(required),
         "missing_documents": missing,
         "files": per_doc_results,
+        "cache": {
+            "retrieval": retrieval_cache.stats(),
+            "llm": llm_cache.stats(),
+        },
     }
-    return report 
\ No newline at end of file
+    if shared_cache is not None:
+        after = shared_cache.stats()
+        run_calls = after["calls"] - shared_before["calls"]
+        run_hits = after["hits"] - shared_before["hits"] + after["coalesced"] - shared_before["coalesced"]
+        report["cache"]["llm_cross_run"] = {
+            "calls": run_calls,
+            "hits": run_hits,
+            "hit_rate": round(run_hits / run_calls, 3) if run_calls else 0.0,
+        }
+    return report
+
+
+def stream_review(docs: List[Tuple[str, str]], concurrency: int | None = None) -> Iterator[Dict[str, Any]]:
+    # Runs analyze_documents in a background thread and yields events on the caller's thread:
+    # {"event": "issue", "index", "file", "issue"} as issues are found, then {"event": "report"}.
+    events: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+
+    def on_issue(index: int, issue: Dict[str, Any]) -> None:
+        events.put({"event": "issue", "index": index, "file": Path(docs[index][0]).name, "issue": issue})
+
+    def run() -> None:
+        try:
+            events.put({"event": "report", "report": analyze_documents(docs, concurrency, on_issue)})
+        except BaseException as e:
+            events.put({"event": "error", "error": e})
+
+    threading.Thread(target=run, daemon=True).start()
+    while True:
+        event = events.get()
+        if event["event"] == "error":
+            raise event["error"]
+        yield event
+        if event["event"] == "report":
+            return
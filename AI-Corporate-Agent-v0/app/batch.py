@@ -0,0 +1,183 @@
+from __future__ import annotations
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Set, Tuple
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import time
+
+from app.analyzer import analyze_documents
+from app.config import load_config
+from app.doc_cache import parse_documents
+from app.docx_utils import annotate_docx
+from app.ingest import ensure_index
+from app.zip_output import review_items, write_review_zip
+from app import tracing
+
+CHECKPOINT_NAME = "checkpoint.jsonl"
+
+Bundle = Tuple[str, List[str]]
+
+
+def discover_bundles(source: str) -> List[Bundle]:
+    # A manifest (.json list or .jsonl of {"id", "files"}) or a directory where every
+    # sub-directory holding .docx files is one bundle and loose .docx files are bundles of one.
+    src = Path(source)
+    if src.is_file():
+        base = src.parent
+        if src.suffix.lower() == ".jsonl":
+            entries = [json.loads(line) for line in src.read_text(encoding="utf-8").splitlines() if line.strip()]
+        else:
+            entries = json.loads(src.read_text(encoding="utf-8"))
+        return [(str(e["id"]), [str(base / f) for f in e["files"]]) for e in entries]
+    bundles: List[Bundle] = []
+    for entry in sorted(src.iterdir()):
+        if entry.is_dir():
+            files = sorted(str(p) for p in entry.rglob("*.docx") if not p.name.startswith("~$"))
+            if files:
+                bundles.append((entry.name, files))
+        elif entry.suffix.lower() == ".docx" and not entry.name.startswith("~$"):
+            bundles.append((entry.stem, [str(entry)]))
+    return bundles
+
+
+def _safe_name(bundle_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", bundle_id).strip("._") or "bundle"
+
+
+def review_bundle(bundle_id: str, files: List[str], out_dir: str, as_zip: bool = False) -> Dict[str, Any]:
+    # Reviews one bundle into <out_dir>/<id>/ (report.json + REVIEWED_*.docx), or <out_dir>/<id>.zip.
+    # Output is built under a hidden partial name and renamed into place, so a crash never
+    # leaves a half-written bundle.
+    with tracing.trace("bundle"):
+        return _review_bundle(bundle_id, files, out_dir, as_zip)
+
+
+def _review_bundle(bundle_id: str, files: List[str], out_dir: str, as_zip: bool) -> Dict[str, Any]:
+    started = time.perf_counter()
+    parsed = parse_documents([(f, None) for f in files])
+    docs = [(f, p.text) for f, p in zip(files, parsed)]
+    report = analyze_documents(docs)
+    out = Path(out_dir)
+    if as_zip:
+        final = out / f"{_safe_name(bundle_id)}.zip"
+        partial = out / f".{final.name}.partial"
+        with open(partial, "wb") as f:
+            write_review_zip(f, review_items(parsed, report), report)
+        os.replace(partial, final)
+    else:
+        final = out / _safe_name(bundle_id)
+        partial = out / f".{final.name}.partial"
+        shutil.rmtree(partial, ignore_errors=True)
+        partial.mkdir(parents=True)
+        for (path, _text), doc, item in zip(docs, parsed, report["files"]):
+            annotate_docx(path, item.get("issues", []), str(partial / f"REVIEWED_{item['file']}"), parsed=doc)
+        (partial / "report.json").write_text(json.dumps(report, indent=2), encoding="utf-8")
+        shutil.rmtree(final, ignore_errors=True)
+        os.replace(partial, final)
+    return {
+        "id": bundle_id,
+        "status": "done",
+        "output": str(final),
+        "process": report["process"],
+        "files": len(files),
+        "issues": sum(len(f.get("issues", [])) for f in report["files"]),
+        "missing_documents": report["missing_documents"],
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _review_safely(bundle_id: str, files: List[str], out_dir: str, as_zip: bool = False) -> Dict[str, Any]:
+    try:
+        return review_bundle(bundle_id, files, out_dir, as_zip)
+    except Exception as e:
+        return {"id": bundle_id, "status": "failed", "error": f"{type(e).__name__}: {e}"}
+
+
+def load_checkpoint(out_dir: str) -> Dict[str, Dict[str, Any]]:
+    # Last record per bundle id wins; a torn final line from a crash is ignored
+    state: Dict[str, Dict[str, Any]] = {}
+    path = Path(out_dir) / CHECKPOINT_NAME
+    if not path.exists():
+        return state
+    for line in path.read_text(encoding="utf-8").splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        state[record["id"]] = record
+    return state
+
+
+def run_batch(bundles: List[Bundle], out_dir: str, workers: int = 2, processes: bool = False,
+              retry_failed: bool = False, as_zip: bool = False) -> Iterator[Dict[str, Any]]:
+    # Yields one checkpoint record per bundle as it finishes; bundles already recorded as done
+    # (or failed, unless retry_failed) in <out_dir>/checkpoint.jsonl are skipped.
+    Path(out_dir).mkdir(parents=True, exist_ok=True)
+    state = load_checkpoint(out_dir)
+    skip = {"done", "failed"} if not retry_failed else {"done"}
+    todo = [b for b in bundles if state.get(b[0], {}).get("status") not in skip]
+    if not todo:
+        return
+    workers = max(1, workers)
+    pool_cls = ProcessPoolExecutor if processes else ThreadPoolExecutor
+    with open(Path(out_dir) / CHECKPOINT_NAME, "a", encoding="utf-8") as checkpoint, \
+            pool_cls(max_workers=workers) as pool:
+        pending: Set[Future] = set()
+        queue = iter(todo)
+        # Keep a small window in flight so thousands of bundles are never queued at once
+        for bundle_id, files in queue:
+            pending.add(pool.submit(_review_safely, bundle_id, files, out_dir, as_zip))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                record = fut.result()
+                checkpoint.write(json.dumps(record) + "\n")
+                checkpoint.flush()
+                os.fsync(checkpoint.fileno())
+                yield record
+                nxt = next(queue, None)
+                if nxt is not None:
+                    pending.add(pool.submit(_review_safely, nxt[0], nxt[1], out_dir, as_zip))
+
+
+def main(argv: List[str]) -> int:
+    cfg = load_config()
+    parser = argparse.ArgumentParser(prog="python -m app review",
+                                     description="Review bundles of .docx filings without the UI.")
+    parser.add_argument("source", help="Directory of bundles or a .json/.jsonl manifest")
+    parser.add_argument("-o", "--output", default=str(Path(cfg.output_dir) / "batch"),
+                        help="Output directory (also holds checkpoint.jsonl)")
+    parser.add_argument("-w", "--workers", type=int, default=cfg.batch_workers,
+                        help="Bundles reviewed concurrently")
+    parser.add_argument("--processes", action="store_true",
+                        help="Use worker processes instead of threads")
+    parser.add_argument("--retry-failed", action="store_true",
+                        help="Re-run bundles the checkpoint records as failed")
+    parser.add_argument("--zip", action="store_true",
+                        help="Write each bundle as <id>.zip (reviewed docs + report.json)")
+    parser.add_argument("--skip-index", action="store_true",
+                        help="Do not build the reference index before starting")
+    args = parser.parse_args(argv)
+
+    bundles = discover_bundles(args.source)
+    if not args.skip_index:
+        ensure_index()
+    done = failed = 0
+    for record in run_batch(bundles, args.output, args.workers, args.processes, args.retry_failed,
+                            args.zip):
+        if record["status"] == "done":
+            done += 1
+            print(f"[done] {record['id']}: {record['issues']} issues in {record['seconds']}s", flush=True)
+        else:
+            failed += 1
+            print(f"[failed] {record['id']}: {record['error']}", file=sys.stderr, flush=True)
+    print(f"{len(bundles)} bundles: {done} reviewed, {failed} failed, "
+          f"{len(bundles) - done - failed} already checkpointed", flush=True)
+    return 1 if failed else 0
@@ -0,0 +1,130 @@
+from __future__ import annotations
+from array import array
+from collections import Counter
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Dict, List, Tuple
+import os
+import re
+import numpy as np
+
+from app.vector_index import _top_k
+
+# Words, and numbers with dotted sub-parts so "s.12", "12.3" or "2020" stay searchable
+_TOKEN = re.compile(r"[a-z]+(?:\.\d+)+|[a-z]+|\d+(?:\.\d+)*")
+# Bumped whenever tokenize() changes, so indexes saved with the old tokens are rebuilt
+TOKENIZER_VERSION = 2
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN.findall(text.lower())
+
+
+class BM25Index:
+    # Array-backed inverted index: a sorted term array (looked up with searchsorted) and
+    # CSR postings (term_offsets -> doc_ids / tfs), so it loads as a handful of NumPy arrays.
+    def __init__(self, terms: np.ndarray, term_offsets: np.ndarray, doc_ids: np.ndarray, tfs: np.ndarray,
+                 doc_len: np.ndarray, k1: float = 1.5, b: float = 0.75) -> None:
+        self.terms = terms
+        self.term_offsets = term_offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        self.n_docs = int(len(doc_len))
+        self.avgdl = float(doc_len.mean()) if self.n_docs else 0.0
+
+    @classmethod
+    def build(cls, texts: Sequence) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        post_terms = array("i")
+        post_docs = array("i")
+        post_tfs = array("H")
+        doc_len = np.zeros(len(texts), dtype=np.int32)
+        for d in range(len(texts)):
+            tokens = tokenize(texts[d])
+            doc_len[d] = len(tokens)
+            for term, tf in Counter(tokens).items():
+                tid = vocab.setdefault(term, len(vocab))
+                post_terms.append(tid)
+                post_docs.append(d)
+                post_tfs.append(min(tf, 65535))
+        # Renumber terms in sorted order so lookups can use searchsorted
+        terms_by_id = np.array(list(vocab.keys()), dtype=str) if vocab else np.array([], dtype="<U1")
+        order = np.argsort(terms_by_id, kind="stable")
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        pt = rank[np.frombuffer(post_terms, dtype=np.int32)] if len(post_terms) else np.zeros(0, dtype=np.int64)
+        by_term = np.argsort(pt, kind="stable")
+        term_offsets = np.concatenate([[0], np.cumsum(np.bincount(pt, minlength=len(order)))]).astype(np.int64)
+        return cls(
+            terms_by_id[order],
+            term_offsets,
+            np.frombuffer(post_docs, dtype=np.int32)[by_term].copy(),
+            np.frombuffer(post_tfs, dtype=np.uint16)[by_term].copy(),
+            doc_len,
+        )
+
+    def _postings(self, term: str) -> Tuple[np.ndarray, np.ndarray] | None:
+        i = int(np.searchsorted(self.terms, term))
+        if i >= len(self.terms) or self.terms[i] != term:
+            return None
+        start, end = self.term_offsets[i], self.term_offsets[i + 1]
+        return self.doc_ids[start:end], self.tfs[start:end]
+
+    def scores(self, query: str) -> np.ndarray:
+        scores = np.zeros(self.n_docs, dtype=np.float32)
+        if not self.n_docs:
+            return scores
+        norm = self.k1 * (1 - self.b + self.b * self.doc_len / max(self.avgdl, 1e-9))
+        for term in set(tokenize(query)):
+            post = self._postings(term)
+            if post is None:
+                continue
+            docs, tfs = post
+            df = len(docs)
+            idf = np.log(1 + (self.n_docs - df + 0.5) / (df + 0.5))
+            tf = tfs.astype(np.float32)
+            scores[docs] += idf * tf * (self.k1 + 1) / (tf + norm[docs])
+        return scores
+
+    def search(self, query: str, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        scores = self.scores(query)
+        idx = _top_k(scores, k)
+        idx = idx[scores[idx] > 0]
+        return idx, scores[idx]
+
+    def save(self, path: Path, signature: str = "") -> None:
+        # `signature` identifies the exact chunk store the postings were built from
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, terms=self.terms, term_offsets=self.term_offsets, doc_ids=self.doc_ids,
+                     tfs=self.tfs, doc_len=self.doc_len, tokenizer=np.asarray(TOKENIZER_VERSION),
+                     signature=np.asarray(signature))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, n_docs: int | None = None, signature: str = "") -> "BM25Index | None":
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            if n_docs is not None and len(data["doc_len"]) != n_docs:
+                return None
+            if "tokenizer" not in data.files or int(data["tokenizer"]) != TOKENIZER_VERSION:
+                return None
+            # Same row count is not enough: a rebuild can keep the count and change the rows
+            if (str(data["signature"]) if "signature" in data.files else "") != signature:
+                return None
+            return cls(data["terms"], data["term_offsets"], data["doc_ids"], data["tfs"], data["doc_len"])
+
+
+def reciprocal_rank_fusion(rankings: List[np.ndarray], k: int, rrf_k: int = 60) -> Tuple[np.ndarray, np.ndarray]:
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, idx in enumerate(ranking):
+            if idx < 0:
+                continue
+            fused[int(idx)] = fused.get(int(idx), 0.0) + 1.0 / (rrf_k + rank + 1)
+    best = sorted(fused.items(), key=lambda kv: -kv[1])[:k]
+    return (np.array([i for i, _ in best], dtype=np.int64), np.array([s for _, s in best], dtype=np.float32))
@@ -14,6 +14,15 @@ REQUIRED_DOCS_BY_PROCESS: Dict[str, List[str]] = {
     ],
 }
 
+# Reference index partition per process: references under reference_dir/<partition>/ get their
+# own index, and reviews of that process only search it. Add a process here (and a checklist
+# above) together with its folder, e.g. "Licensing": "licensing". The repo ships
+# data/reference/company_incorporation/; a process whose folder is missing falls back to the
+# default partition (the whole library) with a warning.
+REFERENCE_PARTITIONS: Dict[str, str] = {
+    "Company Incorporation": "company_incorporation",
+}
+
 
 def detect_process_from_docs(detected_types: List[str]) -> str:
     # Simple heuristic: if any formation doc present, assume incorporation
@@ -26,4 +35,15 @@ def detect_process_from_docs(detected_types: List[str]) -> str:
     }
     if any(dt in formation_markers for dt in detected_types):
         return "Company Incorporation"
-    return "Unknown" 
\ No newline at end of file
+    return "Unknown"
+
+
+def partition_for(process: str, doc_type: str = "") -> str:
+    # The bundle's process decides; otherwise the process whose checklist names this doc type.
+    # "" is the default partition (references directly under reference_dir).
+    if process in REFERENCE_PARTITIONS:
+        return REFERENCE_PARTITIONS[process]
+    for name, docs in REQUIRED_DOCS_BY_PROCESS.items():
+        if doc_type in docs and name in REFERENCE_PARTITIONS:
+            return REFERENCE_PARTITIONS[name]
+    return "" 
\ No newline at end of file
@@ -0,0 +1,196 @@
+from __future__ import annotations
+from array import array
+from collections.abc import Sequence
+from pathlib import Path
+from typing import Any, Dict, Iterable, List
+import json
+import struct
+import numpy as np
+
+# Layout of <prefix>.chunks.bin (little endian):
+#   preamble  MAGIC (8 bytes) | format version (u32) | reserved (u32)
+#   blob      UTF-8 chunk texts back to back
+#   columns   int64 offsets[n + 1] into the blob, then one array per metadata key
+#             (int64 for integer keys, int32 ids into an interned string table otherwise),
+#             each aligned to 8 bytes
+#   footer    JSON describing counts, column positions/dtypes and string tables
+#   trailer   footer offset (u64) | footer length (u64) | MAGIC
+# Everything is read through one read-only memmap, so opening is O(columns) and a chunk's
+# text is decoded only when it is actually requested.
+MAGIC = b"ADGMVS\x00\x01"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+_TRAILER = struct.Struct("<QQ8s")
+_INT_MISSING = np.iinfo(np.int64).min
+
+
+class RowSelection(Sequence):
+    # base[rows] followed by tail, without materialising anything
+    def __init__(self, base: Sequence, rows: Iterable[int], tail: Sequence = ()) -> None:
+        self.base = base
+        self.rows = np.asarray(list(rows) if not isinstance(rows, np.ndarray) else rows, dtype=np.int64)
+        self.tail = tail
+
+    def __len__(self) -> int:
+        return len(self.rows) + len(self.tail)
+
+    def __getitem__(self, i: int) -> Any:
+        if i < 0:
+            i += len(self)
+        if i < len(self.rows):
+            return self.base[int(self.rows[i])]
+        return self.tail[i - len(self.rows)]
+
+
+class LazyTexts(Sequence):
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray) -> None:
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return bytes(self._blob[self._offsets[i]:self._offsets[i + 1]]).decode("utf-8")
+
+
+class LazyMetadatas(Sequence):
+    def __init__(self, n: int, columns: Dict[str, np.ndarray], tables: Dict[str, List[Any]]) -> None:
+        self._n = n
+        self.columns = columns
+        self.tables = tables
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        meta: Dict[str, Any] = {}
+        for key, col in self.columns.items():
+            v = int(col[i])
+            table = self.tables.get(key)
+            if table is None:
+                if v != _INT_MISSING:
+                    meta[key] = v
+            elif v >= 0:
+                meta[key] = table[v]
+        return meta
+
+
+def _align(f) -> None:
+    pad = (-f.tell()) % 8
+    if pad:
+        f.write(b"\0" * pad)
+
+
+class ChunkStoreWriter:
+    # Appends chunks one at a time so a store can be produced from a stream; only the offsets
+    # and the (small, integer) metadata columns are held in memory until close().
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._f = open(path, "wb")
+        self._f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, 0))
+        self._blob_start = self._f.tell()
+        self._offsets = array("q", [0])
+        self._raw: Dict[str, List[Any]] = {}
+        self.count = 0
+
+    def append(self, text: str, meta: Dict[str, Any]) -> None:
+        data = text.encode("utf-8")
+        self._f.write(data)
+        self._offsets.append(self._offsets[-1] + len(data))
+        for key in meta:
+            if key not in self._raw:
+                self._raw[key] = [None] * self.count
+        for key, values in self._raw.items():
+            values.append(meta.get(key))
+        self.count += 1
+
+    def close(self) -> None:
+        f = self._f
+        n = self.count
+        columns: Dict[str, Dict[str, Any]] = {}
+        tables: Dict[str, List[Any]] = {}
+        _align(f)
+        columns["__offsets__"] = {"offset": f.tell(), "dtype": "<i8", "count": n + 1}
+        f.write(np.frombuffer(self._offsets, dtype=np.int64).astype("<i8").tobytes())
+        for key, values in self._raw.items():
+            present = [v for v in values if v is not None]
+            if present and all(isinstance(v, int) and not isinstance(v, bool) for v in present):
+                arr = np.array([_INT_MISSING if v is None else v for v in values], dtype="<i8")
+            else:
+                # Interned column: one table entry per distinct value (source paths, types, ...)
+                ids: Dict[str, int] = {}
+                table: List[Any] = []
+                col = np.empty(n, dtype="<i4")
+                for j, v in enumerate(values):
+                    if v is None:
+                        col[j] = -1
+                        continue
+                    token = json.dumps(v, sort_keys=True, ensure_ascii=False)
+                    if token not in ids:
+                        ids[token] = len(table)
+                        table.append(v)
+                    col[j] = ids[token]
+                arr = col
+                tables[key] = table
+            _align(f)
+            columns[key] = {"offset": f.tell(), "dtype": arr.dtype.str, "count": n}
+            f.write(arr.tobytes())
+        footer = json.dumps({
+            "version": FORMAT_VERSION,
+            "count": n,
+            "blob": {"offset": self._blob_start, "length": int(self._offsets[-1])},
+            "columns": columns,
+            "tables": tables,
+        }, ensure_ascii=False).encode("utf-8")
+        footer_offset = f.tell()
+        f.write(footer)
+        f.write(_TRAILER.pack(footer_offset, len(footer), MAGIC))
+        f.close()
+
+
+def write_chunk_store(path: Path, texts: Sequence, metadatas: Sequence) -> None:
+    # Writes `path` directly; callers write to a temp name and swap it in once old views are dropped
+    assert len(texts) == len(metadatas), "texts and metadatas must be aligned"
+    writer = ChunkStoreWriter(path)
+    for i in range(len(texts)):
+        writer.append(texts[i], metadatas[i])
+    writer.close()
+
+
+class ChunkStore:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        size = path.stat().st_size
+        if size < _PREAMBLE.size + _TRAILER.size:
+            raise ValueError(f"Chunk store too small: {path}")
+        self._mm = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, _ = _PREAMBLE.unpack(bytes(self._mm[:_PREAMBLE.size]))
+        footer_offset, footer_len, tail_magic = _TRAILER.unpack(bytes(self._mm[size - _TRAILER.size:]))
+        if magic != MAGIC or tail_magic != MAGIC:
+            raise ValueError(f"Not a chunk store: {path}")
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Chunk store format v{version} is newer than supported v{FORMAT_VERSION}")
+        footer = json.loads(bytes(self._mm[footer_offset:footer_offset + footer_len]).decode("utf-8"))
+        self.count = int(footer["count"])
+        cols: Dict[str, np.ndarray] = {}
+        for key, spec in footer["columns"].items():
+            dtype = np.dtype(spec["dtype"])
+            start = int(spec["offset"])
+            cols[key] = self._mm[start:start + dtype.itemsize * int(spec["count"])].view(dtype)
+        blob = footer["blob"]
+        self.offsets = cols.pop("__offsets__")
+        self.texts = LazyTexts(self._mm[blob["offset"]:blob["offset"] + blob["length"]], self.offsets)
+        self.metadatas = LazyMetadatas(self.count, cols, footer.get("tables", {}))
+
+    def __len__(self) -> int:
+        return self.count
@@ -0,0 +1,84 @@
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Tuple
+import hashlib
+import json
+import threading
+import time
+
+
+def request_key(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+class CoalescingCache:
+    # Memoizes call results by key. Concurrent callers of a key that is still being computed
+    # wait for the first caller's result instead of issuing the same request again.
+    # ttl <= 0 means entries never expire (use a fresh instance per review run for that scope).
+    def __init__(self, ttl: float = 0, max_entries: int = 1024) -> None:
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._done: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.coalesced = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: str, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            entry = self._done.get(key)
+            if entry is not None and (self.ttl <= 0 or time.monotonic() - entry[0] < self.ttl):
+                self._done.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            fut = self._inflight.get(key)
+            owner = fut is None
+            if owner:
+                fut = Future()
+                self._inflight[key] = fut
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return fut.result()
+        try:
+            value = fn()
+        except BaseException as e:
+            # Failures are shared with waiters but never cached
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_exception(e)
+            raise
+        with self._lock:
+            self._done[key] = (time.monotonic(), value)
+            self._done.move_to_end(key)
+            while len(self._done) > self.max_entries:
+                self._done.popitem(last=False)
+            self._inflight.pop(key, None)
+        fut.set_result(value)
+        return value
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.hits + self.coalesced + self.misses
+        return {
+            "calls": calls,
+            "hits": self.hits,
+            "coalesced": self.coalesced,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.coalesced) / calls, 3) if calls else 0.0,
+        }
+
+
+_shared_llm_cache: CoalescingCache | None = None
+_shared_lock = threading.Lock()
+
+
+def shared_llm_cache(ttl: float) -> CoalescingCache:
+    # Process-wide completion cache used when LLM_CACHE_TTL > 0 so runs can reuse answers
+    global _shared_llm_cache
+    with _shared_lock:
+        if _shared_llm_cache is None or _shared_llm_cache.ttl != ttl:
+            _shared_llm_cache = CoalescingCache(ttl=ttl)
+        return _shared_llm_cache
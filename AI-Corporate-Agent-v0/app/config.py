@@ -16,6 +16,44 @@ class AppConfig:
     vector_db_path: str
     reference_dir: str
     output_dir: str
+    vector_index: str
+    ivf_nlist: int
+    ivf_nprobe: int
+    vector_rerank: int
+    pq_subvectors: int
+    embedding_cache_path: str
+    embedding_cache_max_mb: int
+    embedding_cache_memory_items: int
+    embed_unavailable_cooldown: float
+    ollama_embed_batch_size: int
+    ollama_embed_concurrency: int
+    ollama_embed_retries: int
+    review_concurrency: int
+    review_process_workers: int
+    llm_cache_ttl: float
+    llm_timeout: float
+    llm_connect_timeout: float
+    llm_max_connections: int
+    llm_retries: int
+    llm_retry_backoff: float
+    retrieval_mode: str
+    retrieval_scoring: str
+    rrf_k: int
+    retrieval_clause_budget: int
+    context_token_budget: int
+    ingest_workers: int
+    ingest_embed_batch_size: int
+    rules_path: str
+    document_cache_items: int
+    document_cache_mb: int
+    document_cache_dir: str
+    batch_workers: int
+    llm_provider: str
+    service_workers: int
+    service_queue_size: int
+    service_keep_jobs: int
+    trace_path: str
+    local_embed_threads: int
 
 
 def load_config() -> AppConfig:
@@ -36,4 +74,42 @@ def load_config() -> AppConfig:
         vector_db_path=os.getenv("VECTOR_DB_PATH", "./data/vector"),
         reference_dir=os.getenv("REFERENCE_DIR", "./data/reference"),
         output_dir=os.getenv("OUTPUT_DIR", "./outputs"),
+        vector_index=os.getenv("VECTOR_INDEX", "exact"),
+        ivf_nlist=int(os.getenv("IVF_NLIST", "0")),
+        ivf_nprobe=int(os.getenv("IVF_NPROBE", "8")),
+        vector_rerank=int(os.getenv("VECTOR_RERANK", "10")),
+        pq_subvectors=int(os.getenv("PQ_SUBVECTORS", "0")),
+        embedding_cache_path=os.getenv("EMBEDDING_CACHE_PATH", "./data/embedding_cache.sqlite"),
+        embedding_cache_max_mb=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")),
+        embedding_cache_memory_items=int(os.getenv("EMBEDDING_CACHE_MEMORY_ITEMS", "4096")),
+        embed_unavailable_cooldown=float(os.getenv("EMBED_UNAVAILABLE_COOLDOWN", "30")),
+        ollama_embed_batch_size=int(os.getenv("OLLAMA_EMBED_BATCH_SIZE", "32")),
+        ollama_embed_concurrency=int(os.getenv("OLLAMA_EMBED_CONCURRENCY", "4")),
+        ollama_embed_retries=int(os.getenv("OLLAMA_EMBED_RETRIES", "3")),
+        review_concurrency=int(os.getenv("REVIEW_CONCURRENCY", "4")),
+        review_process_workers=int(os.getenv("REVIEW_PROCESS_WORKERS", "0")),
+        llm_cache_ttl=float(os.getenv("LLM_CACHE_TTL", "0")),
+        llm_timeout=float(os.getenv("LLM_TIMEOUT", "120")),
+        llm_connect_timeout=float(os.getenv("LLM_CONNECT_TIMEOUT", "10")),
+        llm_max_connections=int(os.getenv("LLM_MAX_CONNECTIONS", "10")),
+        llm_retries=int(os.getenv("LLM_RETRIES", "2")),
+        llm_retry_backoff=float(os.getenv("LLM_RETRY_BACKOFF", "0.5")),
+        retrieval_mode=os.getenv("RETRIEVAL_MODE", "type").lower(),
+        retrieval_scoring=os.getenv("RETRIEVAL_SCORING", "hybrid").lower(),
+        rrf_k=int(os.getenv("RRF_K", "60")),
+        retrieval_clause_budget=int(os.getenv("RETRIEVAL_CLAUSE_BUDGET", "200000")),
+        context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "2000")),
+        ingest_workers=int(os.getenv("INGEST_WORKERS", "0")),
+        ingest_embed_batch_size=int(os.getenv("INGEST_EMBED_BATCH_SIZE", "256")),
+        rules_path=os.getenv("RULES_PATH", ""),
+        document_cache_items=int(os.getenv("DOCUMENT_CACHE_ITEMS", "64")),
+        document_cache_mb=int(os.getenv("DOCUMENT_CACHE_MB", "256")),
+        document_cache_dir=os.getenv("DOCUMENT_CACHE_DIR", ""),
+        batch_workers=int(os.getenv("BATCH_WORKERS", "2")),
+        llm_provider=os.getenv("LLM_PROVIDER", "auto").lower(),
+        service_workers=int(os.getenv("SERVICE_WORKERS", "2")),
+        service_queue_size=int(os.getenv("SERVICE_QUEUE_SIZE", "32")),
+        service_keep_jobs=int(os.getenv("SERVICE_KEEP_JOBS", "200")),
+        trace_path=os.getenv("TRACE_PATH", ""),
+        local_embed_threads=int(os.getenv("LOCAL_EMBED_THREADS", "4")),
     ) 
\ No newline at end of file
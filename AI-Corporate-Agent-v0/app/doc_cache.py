@@ -0,0 +1,227 @@
+from __future__ import annotations
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any, Dict, List, Sequence, Tuple
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+
+from docx import Document  # type: ignore
+
+from app.config import AppConfig, load_config
+from app import tracing
+from app.text_extractor import ParagraphSpan, docx_layout, extract_text_with_metadata
+
+CACHE_VERSION = 1
+
+
+@dataclass
+class ParsedDocument:
+    digest: str
+    name: str
+    kind: str
+    text: str
+    # Body paragraphs as (start, end, run lengths) into `text`; empty for non-DOCX inputs
+    paragraphs: List[ParagraphSpan] = field(default_factory=list)
+    # The caller's upload bytes, so annotation can reopen the file without touching disk; never
+    # kept by the cache tiers (a hit re-attaches the bytes of the current request)
+    data: bytes | None = field(default=None, repr=False)
+    _lower: str | None = field(default=None, repr=False)
+
+    @property
+    def lower_text(self) -> str:
+        if self._lower is None:
+            lower = self.text.lower()
+            if len(lower) != len(self.text):
+                # A few characters lowercase to two code points; keep offsets aligned with `text`
+                lower = "".join(c if len(c.lower()) != 1 else c.lower() for c in self.text)
+            self._lower = lower
+        return self._lower
+
+    def open_docx(self):
+        return Document(io.BytesIO(self.data)) if self.data is not None else None
+
+
+class DocumentCache:
+    # Parsed uploads keyed by the SHA-256 of their bytes: an in-memory LRU bounded by entries and
+    # by total size (text + layout only, no raw bytes), optionally backed by one JSON file per
+    # digest in `disk_dir`, so Streamlit reruns and repeat reviews of the same file skip the
+    # DOCX parse entirely.
+    def __init__(self, memory_items: int = 64, disk_dir: str = "", memory_bytes: int = 256 << 20) -> None:
+        self.memory_items = memory_items
+        self.memory_bytes = memory_bytes
+        self.disk_dir = disk_dir
+        self._mem: "OrderedDict[str, ParsedDocument]" = OrderedDict()
+        self._mem_size: Dict[str, int] = {}
+        self._mem_total = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if disk_dir:
+            Path(disk_dir).mkdir(parents=True, exist_ok=True)
+
+    def _remember(self, doc: ParsedDocument) -> None:
+        size = _footprint(doc)
+        if doc.digest in self._mem or size > self.memory_bytes:
+            return
+        self._mem[doc.digest] = replace(doc, data=None, _lower=None)
+        self._mem_size[doc.digest] = size
+        self._mem_total += size
+        while self._mem and (len(self._mem) > self.memory_items or self._mem_total > self.memory_bytes):
+            digest, _ = self._mem.popitem(last=False)
+            self._mem_total -= self._mem_size.pop(digest)
+
+    def _disk_path(self, digest: str) -> Path:
+        return Path(self.disk_dir) / f"{digest}.json"
+
+    def _load_disk(self, digest: str) -> Dict[str, Any] | None:
+        if not self.disk_dir:
+            return None
+        try:
+            payload = json.loads(self._disk_path(digest).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        return payload if payload.get("version") == CACHE_VERSION else None
+
+    def _save_disk(self, doc: ParsedDocument) -> None:
+        if not self.disk_dir:
+            return
+        path = self._disk_path(doc.digest)
+        tmp = path.with_suffix(".json.tmp")
+        payload = {"version": CACHE_VERSION, "kind": doc.kind, "text": doc.text,
+                   "paragraphs": [list(p) for p in doc.paragraphs]}
+        tmp.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp, path)
+
+    def parse(self, path: str, data: bytes | None = None) -> ParsedDocument:
+        with tracing.span("extract", file=Path(path).name) as attrs:
+            doc = self._parse(path, data)
+            attrs["chars"] = len(doc.text)
+            attrs["paragraphs"] = len(doc.paragraphs)
+        return doc
+
+    def _parse(self, path: str, data: bytes | None) -> ParsedDocument:
+        if data is None:
+            data = Path(path).read_bytes()
+        name = Path(path).name
+        digest = hashlib.sha256(data).hexdigest()
+        doc = self._lookup(digest, name, data)
+        if doc is None:
+            doc = _parse_bytes(digest, name, path, data)
+            self._store(doc)
+        return doc
+
+    def _lookup(self, digest: str, name: str, data: bytes) -> ParsedDocument | None:
+        with self._lock:
+            doc = self._mem.get(digest)
+            if doc is not None:
+                self._mem.move_to_end(digest)
+                self.hits += 1
+                tracing.count("doc_cache.hits")
+                # Same bytes uploaded under another name share the parse but keep their own name
+                return ParsedDocument(digest, name, doc.kind, doc.text, doc.paragraphs, data)
+        payload = self._load_disk(digest)
+        if payload is None:
+            return None
+        doc = ParsedDocument(digest, name, payload["kind"], payload["text"],
+                             [(s, e, runs) for s, e, runs in payload["paragraphs"]], data)
+        self.disk_hits += 1
+        tracing.count("doc_cache.disk_hits")
+        with self._lock:
+            self._remember(doc)
+        return doc
+
+    def _store(self, doc: ParsedDocument) -> None:
+        self.misses += 1
+        tracing.count("doc_cache.misses")
+        self._save_disk(doc)
+        with self._lock:
+            self._remember(doc)
+
+    def parse_many(self, items: Sequence[Tuple[str, bytes | None]], workers: int = 0) -> List[ParsedDocument]:
+        # Like parse() per item, but cache misses are extracted in a process pool of `workers`
+        # (extraction is the CPU-heavy part of a review); the workers' "extract" spans are
+        # merged into the caller's trace
+        if workers <= 0 or len(items) < 2:
+            return [self.parse(path, data) for path, data in items]
+        loaded = [(path, data if data is not None else Path(path).read_bytes()) for path, data in items]
+        out: List[ParsedDocument | None] = []
+        todo: List[Tuple[str, str, str, bytes]] = []
+        for path, data in loaded:
+            digest = hashlib.sha256(data).hexdigest()
+            doc = self._lookup(digest, Path(path).name, data)
+            out.append(doc)
+            if doc is None:
+                todo.append((digest, Path(path).name, path, data))
+        if todo:
+            with ProcessPoolExecutor(max_workers=min(workers, len(todo))) as pool:
+                parsed = list(pool.map(_parse_in_worker, *zip(*todo)))
+            done = iter(parsed)
+            for i, doc in enumerate(out):
+                if doc is None:
+                    doc, state = next(done)
+                    tracing.merge(state)
+                    doc.data = loaded[i][1]
+                    self._store(doc)
+                    out[i] = doc
+        return out  # type: ignore[return-value]
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "memory_items": len(self._mem), "memory_bytes": self._mem_total}
+
+
+def _footprint(doc: ParsedDocument) -> int:
+    # Approximate resident size of a memory-tier entry: the text plus the paragraph layout
+    return sys.getsizeof(doc.text) + sum(72 + 8 * len(runs) for _s, _e, runs in doc.paragraphs)
+
+
+def _parse_bytes(digest: str, name: str, path: str, data: bytes) -> ParsedDocument:
+    suffix = Path(name).suffix.lower()
+    if suffix == ".docx":
+        text, paragraphs = docx_layout(Document(io.BytesIO(data)))
+        return ParsedDocument(digest, name, "docx", text, paragraphs, data)
+    if suffix in (".md", ".txt"):
+        return ParsedDocument(digest, name, suffix.lstrip("."), data.decode("utf-8", errors="ignore"), [], data)
+    text, meta = extract_text_with_metadata(path)
+    return ParsedDocument(digest, name, meta.get("type", ""), text, [], data)
+
+
+def _parse_in_worker(digest: str, name: str, path: str, data: bytes) -> Tuple[ParsedDocument, Dict[str, Any]]:
+    with tracing.capture("extract") as tr:
+        with tracing.span("extract", file=name) as attrs:
+            doc = _parse_bytes(digest, name, path, data)
+            attrs["chars"] = len(doc.text)
+            attrs["paragraphs"] = len(doc.paragraphs)
+    doc.data = None  # the caller already holds the bytes; do not ship them back
+    return doc, tr.state()
+
+
+_cache: DocumentCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_document_cache(cfg: AppConfig | None = None) -> DocumentCache:
+    global _cache
+    cfg = cfg or load_config()
+    with _cache_lock:
+        if _cache is None or _cache.disk_dir != cfg.document_cache_dir:
+            _cache = DocumentCache(cfg.document_cache_items, cfg.document_cache_dir, cfg.document_cache_mb << 20)
+    return _cache
+
+
+def parse_document(path: str, data: bytes | None = None) -> ParsedDocument:
+    return get_document_cache().parse(path, data)
+
+
+def parse_documents(items: Sequence[Tuple[str, bytes | None]]) -> List[ParsedDocument]:
+    # A review's uploads; extracted in REVIEW_PROCESS_WORKERS processes when that is set
+    cfg = load_config()
+    return get_document_cache(cfg).parse_many(items, cfg.review_process_workers)
+
@@ -1,13 +1,36 @@
 from __future__ import annotations
-from typing import List, Dict, Any
+from bisect import bisect_right
+from copy import deepcopy
+from typing import IO, List, Dict, Any, Set, Tuple
 from pathlib import Path
 from docx import Document  # type: ignore
 from docx.enum.text import WD_COLOR_INDEX  # type: ignore
 from docx.shared import Pt  # type: ignore
+from docx.text.run import Run  # type: ignore
 
+from app.aho_corasick import AhoCorasick
+from app.doc_cache import ParsedDocument, parse_document
+from app import tracing
 
-def annotate_docx(input_path: str, issues: List[Dict[str, Any]], output_path: str) -> None:
-    doc = Document(input_path)
+COMMENT_AUTHOR = "ADGM Corporate Agent"
+# Run children that Run.text round-trips exactly; runs holding anything else (fields,
+# drawings, footnote references) are highlighted whole rather than split
+_SPLITTABLE = {"rPr", "t", "tab", "br", "cr"}
+
+
+def annotate_docx(input_path: str, issues: List[Dict[str, Any]], output_path: str | IO[bytes],
+                  parsed: ParsedDocument | None = None) -> None:
+    # output_path may also be a writable binary stream (e.g. an entry of a zip being written)
+    # Reuse the cached parse of the upload (text + paragraph offsets) instead of re-extracting
+    parsed = parsed or parse_document(input_path)
+    with tracing.span("annotate", file=parsed.name, issues=len(issues), paragraphs=len(parsed.paragraphs)):
+        _annotate(input_path, issues, output_path, parsed)
+
+
+def _annotate(input_path: str, issues: List[Dict[str, Any]], output_path: str | IO[bytes],
+              parsed: ParsedDocument) -> None:
+    doc = parsed.open_docx() or Document(input_path)
+    body = doc.paragraphs
 
     # Add a summary section at the top
     heading = doc.paragraphs[0] if doc.paragraphs else doc.add_paragraph()
@@ -25,17 +48,109 @@ def annotate_docx(input_path: str, issues: List[Dict[str, Any]], output_path: st
         if issue.get("citation"):
             doc.add_paragraph(f"Citation: {issue['citation']}")
 
-    # Try to highlight occurrences of section hints
-    for issue in issues:
-        hint = (issue.get("section_hint") or "").strip()
-        if not hint:
+    _mark_issues(doc, body, parsed, issues)
+
+    if isinstance(output_path, (str, Path)):
+        Path(output_path).parent.mkdir(parents=True, exist_ok=True)
+    doc.save(output_path)
+
+
+def _issue_needles(issue: Dict[str, Any]) -> List[str]:
+    needles = [issue.get("section_hint") or ""]
+    needles += [e.get("text") or "" for e in issue.get("evidence") or []]
+    out: List[str] = []
+    for n in needles:
+        n = n.strip().lower()
+        if len(n) >= 3 and n not in out:
+            out.append(n)
+    return out
+
+
+def _mark_issues(doc, body, parsed: ParsedDocument, issues: List[Dict[str, Any]]) -> None:
+    # Every hint (section hints plus rule evidence) goes into one Aho-Corasick automaton that
+    # scans the cached extracted text once; matches are mapped onto paragraphs via the cached
+    # offsets, runs are split at match boundaries so highlights cover exactly the matched
+    # text (across runs too), and each issue gets a Word comment on its first match.
+    owners: Dict[str, List[int]] = {}
+    for idx, issue in enumerate(issues):
+        for needle in _issue_needles(issue):
+            owners.setdefault(needle, []).append(idx)
+    if not owners or not parsed.paragraphs:
+        return
+    needles = list(owners)
+    spans = parsed.paragraphs
+    starts = [start for start, _end, _runs in spans]
+    by_para: Dict[int, List[Tuple[int, int, int]]] = {}
+    first_match: Dict[int, int] = {}
+    matches: List[Tuple[int, int]] = []
+    for start, end, pid in AhoCorasick(needles).finditer(parsed.lower_text):
+        m = len(matches)
+        matches.append((start, pid))
+        i = max(bisect_right(starts, start) - 1, 0)
+        while i < len(spans) and i < len(body) and spans[i][0] < end:
+            ps, pe, _runs = spans[i]
+            s, e = max(start, ps) - ps, min(end, pe) - ps
+            if s < e:
+                by_para.setdefault(i, []).append((s, e, m))
+            i += 1
+        for idx in owners[needles[pid]]:
+            first_match.setdefault(idx, m)
+
+    anchors: Dict[int, List[Run]] = {}
+    for i, para_matches in by_para.items():
+        cuts = {b for s, e, _m in para_matches for b in (s, e)}
+        laid_out = _split_runs(body[i], spans[i][2], cuts)
+        for s, e, m in para_matches:
+            if laid_out is None:
+                needle = needles[matches[m][1]]
+                covered = [r for r in body[i].runs if needle in r.text.lower()] or body[i].runs
+            else:
+                covered = [r for r, rs, re_ in laid_out if rs < e and re_ > s]
+            for run in covered:
+                run.font.highlight_color = WD_COLOR_INDEX.YELLOW
+                run.bold = True
+            anchors.setdefault(m, []).extend(covered)
+
+    if not hasattr(doc, "add_comment"):
+        return  # python-docx < 1.2 has no comments API; highlights and the notes section remain
+    for idx, m in first_match.items():
+        runs = anchors.get(m)
+        if not runs:
             continue
-        for para in doc.paragraphs:
-            if hint.lower() in para.text.lower():
-                for run in para.runs:
-                    if hint.lower() in run.text.lower():
-                        run.font.highlight_color = WD_COLOR_INDEX.YELLOW
-                        run.bold = True
-
-    Path(output_path).parent.mkdir(parents=True, exist_ok=True)
-    doc.save(output_path) 
\ No newline at end of file
+        issue = issues[idx]
+        comment = doc.add_comment(runs, text=f"[{idx + 1}] {issue.get('issue', '')}",
+                                  author=COMMENT_AUTHOR, initials="ADGM")
+        if issue.get("suggestion"):
+            comment.add_paragraph(f"Suggestion: {issue['suggestion']}")
+        if issue.get("citation"):
+            comment.add_paragraph(f"Citation: {issue['citation']}")
+
+
+def _split_runs(paragraph, run_lengths: List[int], cuts: Set[int]):
+    # Returns [(run, start, end)] with runs split at every cut offset, or None when the cached
+    # run layout no longer matches the paragraph
+    runs = paragraph.runs
+    if not run_lengths or len(runs) != len(run_lengths):
+        return None
+    out = []
+    pos = 0
+    for run, length in zip(runs, run_lengths):
+        inner = sorted(c - pos for c in cuts if pos < c < pos + length)
+        if inner and all(child.tag.rsplit("}", 1)[-1] in _SPLITTABLE for child in run._r):
+            text = run.text
+            bounds = [0] + inner + [length]
+            template = deepcopy(run._r)
+            prev = run._r
+            run.text = text[:bounds[1]]
+            out.append((run, pos, pos + bounds[1]))
+            for a, b in zip(bounds[1:], bounds[2:]):
+                el = deepcopy(template)
+                prev.addnext(el)
+                piece = Run(el, paragraph)
+                piece.text = text[a:b]
+                out.append((piece, pos + a, pos + b))
+                prev = el
+        else:
+            out.append((run, pos, pos + length))
+        pos += length
+    return out
@@ -0,0 +1,145 @@
+from __future__ import annotations
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+import hashlib
+import sqlite3
+import threading
+import time
+import numpy as np
+
+from app.config import AppConfig, load_config
+from app import tracing
+
+
+def cache_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    # Two tiers: an in-memory LRU of recent vectors in front of a SQLite table whose total
+    # payload is capped at `max_bytes` (least recently used rows are evicted first).
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024, memory_items: int = 4096) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.memory_items = memory_items
+        self._mem: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, model TEXT NOT NULL, dim INTEGER NOT NULL, "
+            "vec BLOB NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings(last_used)")
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0]
+
+    def _remember(self, key: str, vec: np.ndarray) -> None:
+        self._mem[key] = vec
+        self._mem.move_to_end(key)
+        while len(self._mem) > self.memory_items:
+            self._mem.popitem(last=False)
+
+    def get_many(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            missing: List[str] = []
+            for key in keys:
+                vec = self._mem.get(key)
+                if vec is None:
+                    missing.append(key)
+                else:
+                    self._mem.move_to_end(key)
+                    found[key] = vec
+            now = time.time()
+            for i in range(0, len(missing), 500):
+                part = missing[i:i + 500]
+                rows = self._db.execute(
+                    f"SELECT key, vec FROM embeddings WHERE key IN ({','.join('?' * len(part))})", part
+                ).fetchall()
+                for key, blob in rows:
+                    vec = np.frombuffer(blob, dtype=np.float32)
+                    found[key] = vec
+                    self._remember(key, vec)
+                if rows:
+                    self._db.executemany("UPDATE embeddings SET last_used=? WHERE key=?",
+                                         [(now, key) for key, _ in rows])
+        return found
+
+    def put_many(self, model: str, items: List[Tuple[str, np.ndarray]]) -> None:
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            rows = []
+            for key, vec in items:
+                vec = np.ascontiguousarray(vec, dtype=np.float32)
+                self._remember(key, vec)
+                rows.append((key, model, int(vec.shape[0]), vec.tobytes(), now))
+            self._db.execute("BEGIN")
+            self._db.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._db.execute("COMMIT")
+            self._bytes += sum(len(r[3]) for r in rows)
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self) -> None:
+        # Trim to 90% of the cap so eviction does not run on every insert
+        target = int(self.max_bytes * 0.9)
+        self._bytes = self._db.execute("SELECT COALESCE(SUM(LENGTH(vec)), 0) FROM embeddings").fetchone()[0]
+        while self._bytes > target:
+            rows = self._db.execute(
+                "SELECT key, LENGTH(vec) FROM embeddings ORDER BY last_used LIMIT 1000").fetchall()
+            if not rows:
+                break
+            drop: List[str] = []
+            for key, size in rows:
+                drop.append(key)
+                self._bytes -= size
+                if self._bytes <= target:
+                    break
+            self._db.executemany("DELETE FROM embeddings WHERE key=?", [(k,) for k in drop])
+
+    def embed(self, model: str, texts: List[str], embed_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        keys = [cache_key(model, t) for t in texts]
+        found = self.get_many(keys)
+        todo: Dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in todo:
+                todo[key] = text
+        self.hits += len(keys) - sum(1 for k in keys if k in todo)
+        self.misses += len(todo)
+        tracing.count("embed_cache.hits", len(keys) - len(todo))
+        tracing.count("embed_cache.misses", len(todo))
+        if todo:
+            vecs = embed_fn(list(todo.values()))
+            fresh = list(zip(todo.keys(), vecs))
+            self.put_many(model, fresh)
+            found.update(fresh)
+        return np.vstack([found[k] for k in keys]).astype(np.float32, copy=False)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "bytes": int(self._bytes), "memory_items": len(self._mem)}
+
+
+_cache: EmbeddingCache | None = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache(cfg: AppConfig | None = None) -> EmbeddingCache | None:
+    global _cache
+    cfg = cfg or load_config()
+    if not cfg.embedding_cache_path:
+        return None
+    with _cache_lock:
+        if _cache is None or _cache.path != cfg.embedding_cache_path:
+            _cache = EmbeddingCache(
+                cfg.embedding_cache_path,
+                max_bytes=cfg.embedding_cache_max_mb * 1024 * 1024,
+                memory_items=cfg.embedding_cache_memory_items,
+            )
+    return _cache
@@ -1,16 +1,90 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import List, Dict, Any, Tuple
+from typing import Deque, Iterator, List, Dict, Any, Sequence, Set, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import islice
 import uuid
+import hashlib
 import os
 import json
+import threading
+import time
+import warnings
 import numpy as np
-import httpx
 from langchain_text_splitters import RecursiveCharacterTextSplitter  # type: ignore
 
 from app.config import load_config
-from app.text_extractor import extract_text_with_metadata
-from app.llm import LLMClient
+from app.text_extractor import iter_text_units
+from app.llm import get_http_client, get_openai_client
+from app.vector_index import open_index
+from app.embed_cache import get_embedding_cache
+from app.ollama_embed import OllamaEmbedder
+from app.local_embed import get_local_embedder, parse_model
+from app.chunk_store import ChunkStore, ChunkStoreWriter, RowSelection, write_chunk_store
+from app.bm25 import BM25Index, reciprocal_rank_fusion
+from app.checklists import REFERENCE_PARTITIONS
+from app import tracing
+
+# v2: PDFs are chunked per page (chunks carry a "page"), so v1 indexes are rebuilt
+MANIFEST_VERSION = 2
+
+# The silent-fallback warning is shown once per process
+_fallback_warned: List[str] = []
+# "provider@endpoint" -> monotonic time until which it is treated as unreachable (no request is made)
+_provider_down: Dict[str, float] = {}
+
+
+class _DimensionChanged(Exception):
+    pass
+
+
+def _chunk_file(path: str, chunk_size: int, chunk_overlap: int) -> List[Tuple[str, Dict[str, Any]]]:
+    # Module-level so it can run in a worker process; pages are split one at a time
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    chunks: List[Tuple[str, Dict[str, Any]]] = []
+    for text, meta in iter_text_units(path):
+        if not text.strip():
+            continue
+        for chunk in splitter.split_text(text):
+            chunks.append((chunk, {**meta, "chunk_index": len(chunks)}))
+    return chunks
+
+
+def _iter_file_chunks(todo: List[Tuple[str, Dict[str, Any]]], chunk_size: int, chunk_overlap: int,
+                      workers: int) -> Iterator[Tuple[str, List[Tuple[str, Dict[str, Any]]]]]:
+    # Yields (file, chunks) in input order. With workers > 0 files are extracted in a process
+    # pool with at most 2 * workers files in flight, which bounds the chunks held in memory.
+    if workers <= 0 or len(todo) < 2:
+        for key, _ in todo:
+            yield key, _chunk_file(key, chunk_size, chunk_overlap)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: Deque[Tuple[str, Future]] = deque()
+        remaining = iter(todo)
+        for key, _ in islice(remaining, workers * 2):
+            pending.append((key, pool.submit(_chunk_file, key, chunk_size, chunk_overlap)))
+        while pending:
+            key, fut = pending.popleft()
+            nxt = next(remaining, None)
+            if nxt is not None:
+                pending.append((nxt[0], pool.submit(_chunk_file, nxt[0], chunk_size, chunk_overlap)))
+            yield key, fut.result()
+
+
+def _relative_key(key: str, ref: Path) -> str:
+    try:
+        return Path(key).resolve().relative_to(ref.resolve()).as_posix()
+    except ValueError:
+        return key
+
+
+def _file_sha256(path: Path) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
 
 
 class VectorStore:
@@ -19,37 +93,121 @@ class VectorStore:
         self.emb_path = Path(f"{persist_prefix}.embeddings.npy")
         self.meta_path = Path(f"{persist_prefix}.metadatas.jsonl")
         self.text_path = Path(f"{persist_prefix}.texts.jsonl")
+        self.store_path = Path(f"{persist_prefix}.chunks.bin")
+        self.manifest_path = Path(f"{persist_prefix}.manifest.json")
+        self.bm25_path = Path(f"{persist_prefix}.bm25.npz")
         self.embeddings: np.ndarray | None = None
-        self.metadatas: List[Dict[str, Any]] = []
-        self.texts: List[str] = []
+        # Lazy, list-like views over the chunk store (plain lists for legacy .jsonl stores)
+        self.metadatas: Sequence[Dict[str, Any]] = []
+        self.texts: Sequence[str] = []
         self._loaded = False
+        self._signature: Tuple[Tuple[int, int], ...] | None = None
+        self._index = None
+        self._lexical: BM25Index | None = None
+
+    def _file_signature(self) -> Tuple[Tuple[int, int], ...]:
+        sig: List[Tuple[int, int]] = []
+        for p in (self.emb_path, self.store_path, self.meta_path, self.text_path):
+            try:
+                st = p.stat()
+                sig.append((st.st_mtime_ns, st.st_size))
+            except FileNotFoundError:
+                sig.append((0, -1))
+        return tuple(sig)
 
     def _load(self) -> None:
+        signature = self._file_signature()
+        embeddings: np.ndarray | None = None
+        metadatas: Sequence[Dict[str, Any]] = []
+        texts: Sequence[str] = []
         if self.emb_path.exists():
-            self.embeddings = np.load(self.emb_path)
-        if self.meta_path.exists():
-            self.metadatas = [json.loads(l) for l in self.meta_path.read_text(encoding="utf-8").splitlines() if l.strip()]
-        if self.text_path.exists():
-            self.texts = [l for l in self.text_path.read_text(encoding="utf-8").splitlines()]
+            # Memory-mapped so every worker process shares the same page cache
+            embeddings = np.load(self.emb_path, mmap_mode="r")
+        if self.store_path.exists():
+            store = ChunkStore(self.store_path)
+            texts, metadatas = store.texts, store.metadatas
+        # Legacy one-line-per-chunk .jsonl sidecars (misaligned whenever a chunk contains a
+        # newline) and stores whose row counts disagree are never served: they load as empty, so
+        # ensure_index rebuilds them (and the rebuild removes the legacy files)
+        rows = None if embeddings is None else int(embeddings.shape[0])
+        if rows is None or not self.store_path.exists() or not rows == len(texts) == len(metadatas):
+            embeddings, metadatas, texts = None, [], []
+        self.embeddings, self.metadatas, self.texts = embeddings, metadatas, texts
+        self._index = None
+        self._lexical = None
+        self._signature = signature
+        self._loaded = True
+
+    def _write_embeddings(self, kept_idx: np.ndarray, new_embs: np.ndarray | None, block: int = 65536) -> None:
+        # Stream kept rows + new rows into a fresh .npy, then swap it in; readers holding the
+        # old mmap keep a valid file and the full matrix is never materialised in RAM.
+        dim = int(new_embs.shape[1]) if new_embs is not None else int(self.embeddings.shape[1])
+        n_new = 0 if new_embs is None else len(new_embs)
+        self.emb_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.emb_path.with_name(self.emb_path.name + ".tmp")
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.float32, shape=(len(kept_idx) + n_new, dim))
+        for i in range(0, len(kept_idx), block):
+            rows = kept_idx[i:i + block]
+            out[i:i + len(rows)] = self.embeddings[rows]
+        for i in range(0, n_new, block):
+            rows = new_embs[i:i + block]
+            out[len(kept_idx) + i:len(kept_idx) + i + len(rows)] = rows
+        out.flush()
+        del out
+        self.embeddings = None
+        self._index = None
+        os.replace(tmp, self.emb_path)
+        self.embeddings = np.load(self.emb_path, mmap_mode="r")
+
+    def _save_sidecars(self) -> None:
+        tmp = self.store_path.with_name(self.store_path.name + ".tmp")
+        write_chunk_store(tmp, self.texts, self.metadatas)
+        self.texts, self.metadatas = [], []
+        os.replace(tmp, self.store_path)
+        store = ChunkStore(self.store_path)
+        self.texts, self.metadatas = store.texts, store.metadatas
+        for legacy in (self.meta_path, self.text_path):
+            if legacy.exists():
+                legacy.unlink()
+        self._index = None
+        self._signature = self._file_signature()
+        self._lexical = BM25Index.build(self.texts)
+        self._lexical.save(self.bm25_path, signature=self._store_signature())
         self._loaded = True
 
-    def _save(self) -> None:
-        if self.embeddings is not None:
-            np.save(self.emb_path, self.embeddings)
-        with open(self.meta_path, "w", encoding="utf-8") as f:
-            for m in self.metadatas:
-                f.write(json.dumps(m, ensure_ascii=False) + "\n")
-        with open(self.text_path, "w", encoding="utf-8") as f:
-            for t in self.texts:
-                f.write(t + "\n")
+    def _write_manifest(self, params: Dict[str, Any], files: Dict[str, Dict[str, Any]], rows: int,
+                        embedding: Dict[str, Any]) -> None:
+        # `embedding` records the backend and width that actually produced the stored vectors
+        manifest = {"version": MANIFEST_VERSION, "params": params, "rows": rows, "files": files,
+                    "keys": "relative", "embedding": embedding}
+        tmp = self.manifest_path.with_name(self.manifest_path.name + ".tmp")
+        tmp.write_text(json.dumps(manifest, indent=1, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp, self.manifest_path)
 
     def _ensure_loaded(self) -> None:
         if not self._loaded:
             self._load()
 
+    def is_stale(self) -> bool:
+        return not self._loaded or self._file_signature() != self._signature
+
+    def refresh_if_changed(self) -> bool:
+        if self.is_stale():
+            self._load()
+            return True
+        return False
+
+    def get_index(self, rebuild: bool = False):
+        if self._index is None or rebuild:
+            cfg = load_config()
+            self._index = open_index(self.persist_prefix, self.embeddings, kind=cfg.vector_index,
+                                     nlist=cfg.ivf_nlist, nprobe=cfg.ivf_nprobe, rebuild=rebuild,
+                                     rerank=cfg.vector_rerank, pq_m=cfg.pq_subvectors,
+                                     signature="%d:%d" % self._signature[0])
+        return self._index
+
     def _embed_with_openai(self, texts: List[str], api_key: str, base_url: str | None, model: str) -> np.ndarray:
-        from openai import OpenAI  # type: ignore
-        oc = OpenAI(api_key=api_key, base_url=base_url)
+        oc = get_openai_client(api_key, base_url)
         vecs: List[List[float]] = []
         batch_size = 64
         for i in range(0, len(texts), batch_size):
@@ -61,91 +219,401 @@ class VectorStore:
         return arr / norms
 
     def _embed_with_ollama(self, texts: List[str], base_url: str, model: str) -> np.ndarray:
-        # Ollama embeddings endpoint typically expects single prompt per call
-        vecs: List[List[float]] = []
-        with httpx.Client(timeout=120) as client:
-            for t in texts:
-                payload = {"model": model, "prompt": t}
-                r = client.post(f"{base_url.rstrip('/')}/api/embeddings", json=payload)
-                r.raise_for_status()
-                data = r.json()
-                emb = data.get("embedding") or data.get("data", [{}])[0].get("embedding")
-                if not emb:
-                    raise RuntimeError("Ollama embedding response missing 'embedding'")
-                vecs.append(emb)
-        arr = np.asarray(vecs, dtype=np.float32)
-        norms = np.linalg.norm(arr, axis=1, keepdims=True) + 1e-12
-        return arr / norms
+        cfg = load_config()
+        embedder = OllamaEmbedder(
+            base_url,
+            model,
+            batch_size=cfg.ollama_embed_batch_size,
+            concurrency=cfg.ollama_embed_concurrency,
+            retries=cfg.ollama_embed_retries,
+            backoff=cfg.llm_retry_backoff,
+            client=get_http_client(cfg),
+        )
+        return embedder.embed(texts)
+
+    def _embed_texts(self, texts: List[str], allow_fallback: bool = True,
+                     used: List[str] | None = None) -> np.ndarray | None:
+        # `used`, when given, receives the backend that actually produced the vectors
+        # ("fallback:local:384" when the configured provider was unreachable)
+        def produced(backend: str, embs: np.ndarray) -> np.ndarray:
+            if used is not None:
+                used.append(backend)
+            return embs
 
-    def _embed_texts(self, texts: List[str]) -> np.ndarray:
         cfg = load_config()
         api_key = cfg.openai_api_key or os.getenv("OPENAI_API_KEY")
         base_url = cfg.openai_api_base or os.getenv("OPENAI_API_BASE")
         ollama_base = os.getenv("OLLAMA_BASE_URL", cfg.ollama_base_url)
         emb_model = (cfg.embedding_model or "text-embedding-3-small").strip()
 
+        if emb_model.startswith("local"):
+            # In-process hashed n-gram embeddings: no network, so no cache either
+            embedder = get_local_embedder(parse_model(emb_model), cfg.local_embed_threads)
+            with tracing.span("embed", provider=f"local:{embedder.dim}", texts=len(texts)):
+                tracing.count("embed.texts", len(texts))
+                return produced(f"local:{embedder.dim}", embedder.embed(texts))
+        if api_key:
+            provider = f"openai:{emb_model}"
+            endpoint = base_url or ""
+            embed_fn = lambda batch: self._embed_with_openai(batch, api_key, base_url, emb_model)
+        # Use Ollama embeddings if available and requested
+        elif ollama_base and ("nomic" in emb_model or "embed" in emb_model or emb_model.startswith("ollama:")):
+            model_name = emb_model.replace("ollama:", "")
+            provider = f"ollama:{model_name}"
+            endpoint = ollama_base
+            embed_fn = lambda batch: self._embed_with_ollama(batch, ollama_base, model_name)
+        else:
+            provider = endpoint = None
+        # Keyed by endpoint too, so pointing the config at a running server takes effect at once
+        down_key = f"{provider}@{endpoint}"
+        if provider and _provider_down.get(down_key, 0.0) > time.monotonic():
+            # Failed recently: go straight to the fallback instead of paying the timeouts again
+            tracing.count("embed.skipped_unavailable")
+            provider = None
         try:
-            if api_key:
-                return self._embed_with_openai(texts, api_key, base_url, emb_model)
-            # Use Ollama embeddings if available and requested
-            if ollama_base and ("nomic" in emb_model or "embed" in emb_model or emb_model.startswith("ollama:")):
-                model_name = emb_model.replace("ollama:", "")
-                return self._embed_with_ollama(texts, ollama_base, model_name)
+            if provider:
+                with tracing.span("embed", provider=provider, texts=len(texts)):
+                    tracing.count("embed.texts", len(texts))
+                    tracing.count("embed.chars", sum(len(t) for t in texts))
+                    cache = get_embedding_cache(cfg)
+                    if cache is None:
+                        return produced(provider, embed_fn(texts))
+                    return produced(provider, cache.embed(provider, texts, embed_fn))
         except Exception:
-            pass
+            # The failed "embed" span carries the exception type
+            tracing.count("embed.errors")
+            _provider_down[down_key] = time.monotonic() + cfg.embed_unavailable_cooldown
+        if not allow_fallback:
+            return None
+
+        # No provider reachable: local hashed embeddings keep the index usable (never random
+        # vectors), though they are not comparable with the configured model's vectors
+        if not _fallback_warned:
+            _fallback_warned.append(emb_model)
+            warnings.warn(f"Embedding model {emb_model!r} is unavailable; using local hashed embeddings. "
+                          f"Set EMBEDDING_MODEL=local to use them deliberately.", RuntimeWarning)
+        tracing.count("embed.fallback", len(texts))
+        return produced("fallback:local:384", get_local_embedder(384, cfg.local_embed_threads).embed(texts))
+
+    def built_with_fallback(self) -> bool:
+        return str((self._load_manifest().get("embedding") or {}).get("backend", "")).startswith("fallback:")
 
-        # Fallback: deterministic random vectors (demo only)
-        rng = np.random.RandomState(42)
-        return rng.rand(len(texts), 384).astype(np.float32)
+    def _load_manifest(self) -> Dict[str, Any]:
+        try:
+            return json.loads(self.manifest_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            return {}
 
-    def build_from_directory(self, reference_dir: str, chunk_size: int = 1200, chunk_overlap: int = 150) -> None:
-        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
-        docs: List[str] = []
-        metadatas: List[Dict[str, Any]] = []
+    def build_from_directory(self, reference_dir: str, chunk_size: int = 1200, chunk_overlap: int = 150,
+                             full: bool = False, exclude: Sequence[str] = (), _restarted: bool = False) -> Dict[str, Any]:
+        # Incremental: only new/changed files (by content hash) are extracted and embedded,
+        # rows of deleted files are dropped and unchanged rows are copied over as-is.
+        # Changed files flow through a streaming pipeline (extract -> split per page -> embed in
+        # fixed-size batches -> spool to disk), so peak memory does not grow with the corpus.
+        # `exclude` names top-level sub-directories (other partitions) to leave out.
         ref = Path(reference_dir)
         assert ref.exists(), f"Reference dir not found: {ref}"
+        cfg = load_config()
+        params = {
+            "chunk_size": chunk_size,
+            "chunk_overlap": chunk_overlap,
+            "embedding_model": cfg.embedding_model,
+        }
+        self._ensure_loaded()
+        manifest = self._load_manifest()
+        n_old = 0 if self.embeddings is None else int(self.embeddings.shape[0])
+        embedding: Dict[str, Any] = manifest.get("embedding") or {}
+        reusable = (
+            not full
+            and manifest.get("version") == MANIFEST_VERSION
+            and manifest.get("params") == params
+            and manifest.get("rows") == n_old == len(self.texts) == len(self.metadatas)
+            # Vectors from the offline fallback are replaced as soon as a build can do better
+            and not str(embedding.get("backend", "")).startswith("fallback:")
+        )
+        if not reusable:
+            embedding = {}
+        old_files: Dict[str, Dict[str, Any]] = manifest.get("files", {}) if reusable else {}
+        if old_files and manifest.get("keys") != "relative":
+            # Older manifests keyed files by their path as written; re-key them relative to ref
+            old_files = {_relative_key(k, ref): v for k, v in old_files.items()}
+
+        keep = np.zeros(n_old, dtype=bool)
+        files: Dict[str, Dict[str, Any]] = {}
+        todo: List[Tuple[str, Dict[str, Any]]] = []  # (path, manifest entry)
+        todo_keys: Dict[str, str] = {}
+        stats = {"unchanged": 0, "embedded": 0, "removed": 0, "chunks_embedded": 0}
         for file in sorted(ref.glob("**/*")):
-            if not file.is_file():
+            if not file.is_file() or file.relative_to(ref).parts[0] in exclude:
                 continue
             if file.suffix.lower() not in {".docx", ".pdf", ".md", ".txt"}:
                 continue
-            text, meta = extract_text_with_metadata(str(file))
-            if not text.strip():
+            # Keyed relative to ref, so moving or re-pointing the reference dir re-embeds nothing
+            key = file.relative_to(ref).as_posix()
+            st = file.stat()
+            prev = old_files.get(key)
+            if prev and prev["size"] == st.st_size and prev["mtime_ns"] == st.st_mtime_ns:
+                digest = prev["sha256"]
+            else:
+                digest = _file_sha256(file)
+            if prev and prev["sha256"] == digest:
+                keep[prev["start"]:prev["start"] + prev["count"]] = True
+                files[key] = {**prev, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+                stats["unchanged"] += 1
                 continue
-            chunks = splitter.split_text(text)
-            for i, chunk in enumerate(chunks):
-                docs.append(chunk)
-                metadatas.append({**meta, "chunk_index": i})
-        if not docs:
-            return
-        embs = self._embed_texts(docs)
-        self.embeddings = embs
-        self.metadatas = metadatas
-        self.texts = docs
-        self._save()
+            todo.append((str(file), {"sha256": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}))
+            todo_keys[str(file)] = key
+        stats["removed"] = len(set(old_files) - set(files) - set(todo_keys.values()))
+        stats["embedded"] = len(todo)
+
+        kept_idx = np.flatnonzero(keep)
+        if reusable and not todo and len(kept_idx) == n_old:
+            self._write_manifest(params, files, n_old, embedding)
+            return stats
+        new_pos = np.cumsum(keep) - 1
+        for entry in files.values():
+            entry["start"] = int(new_pos[entry["start"]]) if entry["count"] else 0
+
+        spool_emb = self.emb_path.with_name(self.emb_path.name + ".new")
+        spool_store = self.store_path.with_name(self.store_path.name + ".new")
+        old_dim = int(self.embeddings.shape[1]) if len(kept_idx) else None
+        writer = ChunkStoreWriter(spool_store)
+        todo_meta = dict(todo)
+        batch: List[str] = []
+        dim: List[int] = []
+        backends: List[str] = [embedding["backend"]] if embedding.get("backend") and len(kept_idx) else []
+        try:
+            with open(spool_emb, "wb") as emb_out:
+                def flush() -> None:
+                    if not batch:
+                        return
+                    embs = np.asarray(self._embed_texts(batch, used=backends), dtype=np.float32)
+                    # Every row must come from one backend at one width: the kept rows' and the first batch's
+                    if (old_dim is not None and embs.shape[1] != old_dim) or (dim and embs.shape[1] != dim[0]) \
+                            or backends[-1] != backends[0]:
+                        raise _DimensionChanged()
+                    dim[:] = [embs.shape[1]]
+                    emb_out.write(np.ascontiguousarray(embs).tobytes())
+                    batch.clear()
+
+                offset = len(kept_idx)
+                for path, chunks in _iter_file_chunks(todo, chunk_size, chunk_overlap, cfg.ingest_workers):
+                    for text, meta in chunks:
+                        writer.append(text, meta)
+                        batch.append(text)
+                        if len(batch) >= cfg.ingest_embed_batch_size:
+                            flush()
+                    files[todo_keys[path]] = {**todo_meta[path], "start": offset, "count": len(chunks)}
+                    offset += len(chunks)
+                flush()
+            writer.close()
+        except _DimensionChanged:
+            # Embedding dimension changed underneath us (provider switch or a provider failing
+            # mid-build): start over once, from scratch
+            writer.close()
+            spool_emb.unlink(missing_ok=True)
+            spool_store.unlink(missing_ok=True)
+            if _restarted:
+                raise RuntimeError("Embedding width changed twice during the index build; is the embedding provider flapping?")
+            return self.build_from_directory(reference_dir, chunk_size, chunk_overlap, full=True, exclude=exclude,
+                                             _restarted=True)
+        n_new = writer.count
+        stats["chunks_embedded"] = n_new
+        if not n_new and not len(kept_idx):
+            spool_emb.unlink(missing_ok=True)
+            spool_store.unlink(missing_ok=True)
+            return stats
+
+        new_embs = np.memmap(spool_emb, dtype=np.float32, mode="r", shape=(n_new, dim[0])) if n_new else None
+        new_store = ChunkStore(spool_store)
+        self._write_embeddings(kept_idx, new_embs)
+        self.texts = RowSelection(self.texts, kept_idx, new_store.texts)
+        self.metadatas = RowSelection(self.metadatas, kept_idx, new_store.metadatas)
+        self._save_sidecars()
+        del new_embs, new_store
+        spool_emb.unlink(missing_ok=True)
+        spool_store.unlink(missing_ok=True)
+        if backends:
+            embedding = {"backend": backends[0], "dim": int(self.embeddings.shape[1])}
+        self._write_manifest(params, files, len(self.texts), embedding)
+        index = self.get_index(rebuild=True)
+        if getattr(index, "report", None):
+            stats["index"] = index.report
+        return stats
 
     def similarity_search(self, query: str, k: int = 6) -> List[Dict[str, Any]]:
+        return self.similarity_search_batch([query], k=k)[0]
+
+    def _store_signature(self) -> str:
+        # mtime/size of the chunk store this handle loaded; ties bm25.npz to that exact file
+        return "%d:%d" % self._signature[1]
+
+    def get_lexical_index(self) -> BM25Index:
+        if self._lexical is None:
+            signature = self._store_signature()
+            self._lexical = BM25Index.load(self.bm25_path, n_docs=len(self.texts), signature=signature)
+            if self._lexical is None:
+                self._lexical = BM25Index.build(self.texts)
+                # A stale handle (the store was rebuilt since it loaded) keeps its postings in
+                # memory only, so it never overwrites the file belonging to the newer store
+                if self._file_signature()[1] == self._signature[1]:
+                    self._lexical.save(self.bm25_path, signature=signature)
+        return self._lexical
+
+    def similarity_search_batch(self, queries: List[str], k: int = 6,
+                                mode: str | None = None) -> List[List[Dict[str, Any]]]:
+        # mode: "dense" (embeddings), "lexical" (BM25) or "hybrid" (reciprocal-rank fusion of both).
+        # All queries are embedded in one call and scored with a single matrix-matrix product;
+        # if no embedding provider is reachable the search degrades to lexical-only.
         self._ensure_loaded()
-        if self.embeddings is None or not len(self.texts):
-            return []
-        q_emb = self._embed_texts([query])
-        q = q_emb[0]
-        sims = (self.embeddings @ q)
-        topk_idx = np.argsort(-sims)[:k]
-        results: List[Dict[str, Any]] = []
-        for idx in topk_idx:
-            meta = self.metadatas[idx]
-            results.append({"score": float(sims[idx]), **meta, "text": self.texts[idx]})
-        return results
+        if not len(self.texts) or not queries:
+            return [[] for _ in queries]
+        cfg = load_config()
+        mode = (mode or cfg.retrieval_scoring).lower()
+        dense = None
+        if mode != "lexical" and self.embeddings is not None:
+            with tracing.span("retrieval.embed_query", queries=len(queries)):
+                q_emb = self._embed_texts(queries, allow_fallback=False)
+            if q_emb is not None and q_emb.shape[1] != self.embeddings.shape[1]:
+                # Index built by another backend (e.g. the offline fallback): search lexically
+                tracing.count("retrieval.dim_mismatch")
+                q_emb = None
+            if q_emb is not None:
+                with tracing.span("retrieval.search", rows=len(self.texts), queries=len(queries)):
+                    dense = self.get_index().search(q_emb, k if mode == "dense" else k * 4)
+        if dense is not None and mode == "dense":
+            ranked = list(zip(dense[0], dense[1]))
+        else:
+            lexical = self.get_lexical_index()
+            ranked = []
+            with tracing.span("retrieval.lexical", queries=len(queries)):
+                for row, query in enumerate(queries):
+                    lex_ids, lex_scores = lexical.search(query, k if dense is None else k * 4)
+                    if dense is None:
+                        ranked.append((lex_ids, lex_scores))
+                    else:
+                        ranked.append(reciprocal_rank_fusion([dense[0][row], lex_ids], k, rrf_k=cfg.rrf_k))
+        all_results: List[List[Dict[str, Any]]] = []
+        for row_ids, row_sims in ranked:
+            results: List[Dict[str, Any]] = []
+            for idx, score in zip(row_ids, row_sims):
+                if idx < 0 or idx >= len(self.metadatas):
+                    continue
+                meta = self.metadatas[idx]
+                results.append({"score": float(score), "id": int(idx), **meta, "text": self.texts[idx]})
+            all_results.append(results)
+        return all_results
 
 
 essentially_no_op = None
 
-def ensure_index() -> VectorStore:
+# Handles are never mutated once published: a reload or build produces a new VectorStore that
+# replaces the old one under _stores_lock (held only for the swap), so readers keep using a
+# consistent snapshot. Builds of the same prefix are serialised by a per-prefix lock.
+_stores: Dict[str, VectorStore] = {}
+_stores_lock = threading.Lock()
+_build_locks: Dict[str, Any] = {}  # prefix -> RLock (ensure_index re-enters it)
+_building: Set[str] = set()
+
+
+def get_vector_store(prefix: str | None = None) -> VectorStore:
+    # One shared handle per index prefix for the whole process; replaced when files change
+    if prefix is None:
+        prefix = load_config().vector_db_path or "./data/vector"
+    key = str(Path(prefix).resolve())
+    with _stores_lock:
+        vs = _stores.get(key)
+        building = key in _building
+    if vs is not None and (building or not vs.is_stale()):
+        # Mid-build the files are in flux; the previous snapshot is served until the swap
+        return vs
+    fresh = VectorStore(prefix)
+    fresh.refresh_if_changed()
+    with _stores_lock:
+        if _stores.get(key) is vs:
+            _stores[key] = fresh
+        return _stores[key]
+
+
+def _build_store(prefix: str, reference_dir: str, exclude: Sequence[str]) -> Dict[str, Any]:
+    # Builds into a private VectorStore and publishes it once complete
+    key = str(Path(prefix).resolve())
+    with _stores_lock:
+        lock = _build_locks.setdefault(key, threading.RLock())
+    with lock:
+        with _stores_lock:
+            _building.add(key)
+        try:
+            Path(prefix).parent.mkdir(parents=True, exist_ok=True)
+            fresh = VectorStore(prefix)
+            stats = fresh.build_from_directory(reference_dir, exclude=exclude)
+            with _stores_lock:
+                _stores[key] = fresh
+        finally:
+            with _stores_lock:
+                _building.discard(key)
+    return stats
+
+
+def list_partitions(reference_dir: str | None = None) -> List[str]:
+    # Named partitions that exist on disk (reference_dir/<name>/); "" is always the default
+    ref = Path(reference_dir or load_config().reference_dir)
+    return [""] + sorted(p for p in set(REFERENCE_PARTITIONS.values()) if (ref / p).is_dir())
+
+
+def _partition_source(partition: str) -> Tuple[str, str, Sequence[str]]:
+    # (index prefix, reference dir, excluded sub-dirs). The default partition is the whole
+    # reference library (partition folders included), so a review that is not routed, or is
+    # routed to a missing folder, still searches everything; named ones live under
+    # <vector dir>/partitions/<name>/
     cfg = load_config()
     prefix = cfg.vector_db_path or "./data/vector"
-    vs = VectorStore(prefix)
-    vs._ensure_loaded()
-    if vs.embeddings is None or len(vs.texts) == 0:
-        vs.build_from_directory(cfg.reference_dir)
-    return vs 
\ No newline at end of file
+    if not partition:
+        return prefix, cfg.reference_dir, ()
+    base = Path(prefix)
+    return str(base.parent / "partitions" / partition / base.name), str(Path(cfg.reference_dir) / partition), ()
+
+
+_built: Set[str] = set()
+# Missing partition folders are warned about once per process
+_partition_warned: Set[str] = set()
+
+
+def ensure_index(partition: str = "") -> VectorStore:
+    # Partitions are loaded (or built) on first use; an unknown or absent partition falls back
+    # to the default one. Each partition is built at most once per process when empty, or when
+    # it holds offline-fallback vectors (re-embedded once the configured provider is back).
+    if partition and partition not in list_partitions():
+        tracing.count("retrieval.partition_fallback")
+        if partition not in _partition_warned:
+            _partition_warned.add(partition)
+            warnings.warn(f"Reference partition {partition!r} has no folder under REFERENCE_DIR; "
+                          f"searching the whole reference library instead.", RuntimeWarning)
+        partition = ""
+    prefix, reference_dir, exclude = _partition_source(partition)
+    vs = get_vector_store(prefix)
+    if prefix not in _built and (vs.embeddings is None or len(vs.texts) == 0 or vs.built_with_fallback()):
+        with _stores_lock:
+            lock = _build_locks.setdefault(str(Path(prefix).resolve()), threading.RLock())
+        with lock:
+            if prefix not in _built:
+                _build_store(prefix, reference_dir, exclude)
+                _built.add(prefix)
+        vs = get_vector_store(prefix)
+    return vs
+
+
+def refresh_index() -> Dict[str, Any]:
+    # Re-sync every partition with its reference folder; only new or changed files are
+    # re-embedded. Totals are summed, per-partition stats are under "partitions".
+    totals: Dict[str, Any] = {"unchanged": 0, "embedded": 0, "removed": 0, "chunks_embedded": 0, "partitions": {}}
+    for partition in list_partitions():
+        prefix, reference_dir, exclude = _partition_source(partition)
+        stats = _build_store(prefix, reference_dir, exclude)
+        _built.add(prefix)
+        for key in ("unchanged", "embedded", "removed", "chunks_embedded"):
+            totals[key] += stats.get(key, 0)
+        if partition == "" and "index" in stats:
+            totals["index"] = stats["index"]
+        totals["partitions"][partition or "default"] = stats
+    return totals 
\ No newline at end of file
@@ -0,0 +1,83 @@
+from __future__ import annotations
+from typing import Any, Dict, Iterable, Iterator, List
+import json
+
+
+class JSONArrayStream:
+    # Incremental parser for a JSON array of objects arriving in arbitrary chunks (e.g. LLM
+    # token streams). Each top-level object is returned as soon as its closing brace arrives;
+    # prose or code fences around the array are skipped and a truncated tail is simply never
+    # emitted, so everything completed before the cut survives.
+    def __init__(self) -> None:
+        self._buf: List[str] = []
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._obj_start: int | None = None
+        self.done = False
+        self.errors = 0
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        out: List[Dict[str, Any]] = []
+        if self.done or not chunk:
+            return out
+        self._buf.append(chunk)
+        text = "".join(self._buf)
+        self._buf = [text]
+        i = self._pos
+        n = len(text)
+        while i < n:
+            ch = text[i]
+            if not self._started:
+                if ch == "[":
+                    self._started = True
+                    self._depth = 1
+                i += 1
+                continue
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                self._in_string = True
+            elif ch in "{[":
+                if self._depth == 1 and ch == "{":
+                    self._obj_start = i
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                if self._depth == 1 and ch == "}" and self._obj_start is not None:
+                    try:
+                        item = json.loads(text[self._obj_start:i + 1])
+                        if isinstance(item, dict):
+                            out.append(item)
+                    except ValueError:
+                        self.errors += 1
+                    self._obj_start = None
+                elif self._depth == 0:
+                    self.done = True
+                    i += 1
+                    break
+            i += 1
+        # Drop consumed text that can no longer be part of an object
+        keep_from = self._obj_start if self._obj_start is not None else i
+        self._buf = [text[keep_from:]]
+        self._pos = i - keep_from
+        if self._obj_start is not None:
+            self._obj_start = 0
+        return out
+
+    @property
+    def truncated(self) -> bool:
+        return self._started and not self.done
+
+
+def iter_json_array(chunks: Iterable[str]) -> Iterator[Dict[str, Any]]:
+    parser = JSONArrayStream()
+    for chunk in chunks:
+        yield from parser.feed(chunk)
@@ -1,23 +1,188 @@
 from __future__ import annotations
+import asyncio
+import json
+import random
+import threading
+import time
 import httpx
-from typing import List, Dict, Any
-from app.config import load_config
+from typing import AsyncIterator, Iterator, List, Dict, Any
+from app.config import AppConfig, load_config
+from app import tracing
 
 try:
-    from openai import OpenAI  # type: ignore
+    from openai import OpenAI, AsyncOpenAI  # type: ignore
     _has_openai = True
 except Exception:
     _has_openai = False
 
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+_http_client: httpx.Client | None = None
+_http_key: tuple | None = None
+_llm_client: "LLMClient | StubLLMClient | None" = None
+_openai_clients: Dict[tuple, Any] = {}
+_lock = threading.Lock()
+
+
+def _timeout(cfg: AppConfig) -> httpx.Timeout:
+    return httpx.Timeout(cfg.llm_timeout, connect=cfg.llm_connect_timeout)
+
+
+def _limits(cfg: AppConfig) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=cfg.llm_max_connections,
+        max_keepalive_connections=cfg.llm_max_connections,
+        keepalive_expiry=30,
+    )
+
+
+def get_http_client(cfg: AppConfig | None = None) -> httpx.Client:
+    # Process-wide keep-alive pool shared by LLM, OpenAI and Ollama embedding calls
+    global _http_client, _http_key
+    cfg = cfg or load_config()
+    key = (cfg.llm_timeout, cfg.llm_connect_timeout, cfg.llm_max_connections)
+    with _lock:
+        if _http_client is None or _http_key != key:
+            if _http_client is not None:
+                # Release the old pool; OpenAI clients built on it are rebuilt on next use
+                _http_client.close()
+                _openai_clients.clear()
+            _http_client = httpx.Client(timeout=_timeout(cfg), limits=_limits(cfg))
+            _http_key = key
+        return _http_client
+
+
+def get_openai_client(api_key: str, base_url: str | None, cfg: AppConfig | None = None):
+    if not _has_openai:
+        raise RuntimeError("openai package is not installed")
+    cfg = cfg or load_config()
+    key = (api_key, base_url, cfg.llm_retries)
+    with _lock:
+        client = _openai_clients.get(key)
+    if client is None:
+        client = OpenAI(api_key=api_key, base_url=base_url, max_retries=cfg.llm_retries,
+                        timeout=_timeout(cfg), http_client=get_http_client(cfg))
+        with _lock:
+            _openai_clients[key] = client
+    return client
+
+
+def _backoff_delay(backoff: float, attempt: int) -> float:
+    return backoff * (2 ** attempt) * (0.5 + random.random())
+
+
+def _retryable(exc: httpx.TransportError) -> bool:
+    # Connection refused (nothing listening) will not fix itself within a backoff; fail fast
+    return not isinstance(exc, httpx.ConnectError)
+
+
+def post_with_retry(client: httpx.Client, url: str, payload: Dict[str, Any], retries: int = 2,
+                    backoff: float = 0.5) -> httpx.Response:
+    # Retries connection errors and 429/5xx with jittered exponential backoff; the last
+    # response is returned as-is so callers decide how to treat the final status.
+    attempt = 0
+    while True:
+        try:
+            r = client.post(url, json=payload)
+            if r.status_code not in RETRY_STATUS or attempt >= retries:
+                return r
+        except httpx.TransportError as e:
+            if attempt >= retries or not _retryable(e):
+                raise
+        time.sleep(_backoff_delay(backoff, attempt))
+        attempt += 1
+
+
+async def apost_with_retry(client: httpx.AsyncClient, url: str, payload: Dict[str, Any], retries: int = 2,
+                           backoff: float = 0.5) -> httpx.Response:
+    attempt = 0
+    while True:
+        try:
+            r = await client.post(url, json=payload)
+            if r.status_code not in RETRY_STATUS or attempt >= retries:
+                return r
+        except httpx.TransportError as e:
+            if attempt >= retries or not _retryable(e):
+                raise
+        await asyncio.sleep(_backoff_delay(backoff, attempt))
+        attempt += 1
+
+
+def _ollama_payload(cfg: AppConfig, messages: List[Dict[str, str]], temperature: float,
+                    max_tokens: int, stream: bool = False) -> Dict[str, Any]:
+    return {
+        "model": cfg.ollama_model,
+        "messages": messages,
+        "stream": stream,
+        "options": {"temperature": temperature, "num_predict": max_tokens},
+    }
+
+
+def _ollama_content(data: Any) -> str:
+    # Ollama may stream, but final content is often in 'message'
+    if isinstance(data, dict) and "message" in data and data["message"].get("content"):
+        return data["message"]["content"]
+    # If it's a chunked array, join contents
+    if isinstance(data, list):
+        return "".join(chunk.get("message", {}).get("content", "") for chunk in data)
+    return ""
+
+
+def _ollama_stream_piece(line: str, usage: Dict[str, int] | None = None) -> str:
+    # One NDJSON line of a streamed /api/chat response; the final line carries token counts
+    if not line.strip():
+        return ""
+    data = json.loads(line)
+    if data.get("error"):
+        raise RuntimeError(f"Ollama error: {data['error']}")
+    if usage is not None and data.get("done"):
+        usage.update(_ollama_usage(data))
+    return data.get("message", {}).get("content", "")
+
+
+def _ollama_usage(data: Any) -> Dict[str, int]:
+    if not isinstance(data, dict):
+        return {}
+    usage = {}
+    if "prompt_eval_count" in data:
+        usage["prompt_tokens"] = int(data["prompt_eval_count"])
+    if "eval_count" in data:
+        usage["completion_tokens"] = int(data["eval_count"])
+    return usage
+
+
+def _openai_usage(usage: Any) -> Dict[str, int]:
+    if usage is None:
+        return {}
+    return {"prompt_tokens": int(usage.prompt_tokens or 0), "completion_tokens": int(usage.completion_tokens or 0)}
+
+
+def _record_llm(name: str, start: float, model: str, messages: List[Dict[str, str]], content: str,
+                usage: Dict[str, int], status: str = "ok") -> None:
+    prompt_chars = sum(len(m.get("content") or "") for m in messages)
+    tracing.count("llm.calls")
+    tracing.count("llm.prompt_chars", prompt_chars)
+    tracing.count("llm.completion_chars", len(content))
+    for key, value in usage.items():
+        tracing.count(f"llm.{key}", value)
+    tracing.record_span(name, start, model=model, prompt_chars=prompt_chars,
+                        completion_chars=len(content), status=status, **usage)
+
 
 class LLMClient:
-    def __init__(self) -> None:
-        self.cfg = load_config()
+    def __init__(self, cfg: AppConfig | None = None, http_client: httpx.Client | None = None) -> None:
+        self.cfg = cfg or load_config()
+        self._http = http_client or get_http_client(self.cfg)
         self._client = None
         if self.cfg.openai_api_key and _has_openai:
-            self._client = OpenAI(api_key=self.cfg.openai_api_key, base_url=self.cfg.openai_api_base)
+            self._client = get_openai_client(self.cfg.openai_api_key, self.cfg.openai_api_base, self.cfg)
+
+    @property
+    def model_name(self) -> str:
+        return f"openai:{self.cfg.openai_model}" if self._client else f"ollama:{self.cfg.ollama_model}"
 
     def generate(self, messages: List[Dict[str, str]], temperature: float = 0.2, max_tokens: int = 800) -> str:
+        start = time.perf_counter()
         if self._client:
             resp = self._client.chat.completions.create(
                 model=self.cfg.openai_model,
@@ -25,21 +190,214 @@ class LLMClient:
                 temperature=temperature,
                 max_tokens=max_tokens,
             )
-            return resp.choices[0].message.content or ""
+            content = resp.choices[0].message.content or ""
+            _record_llm("llm.generate", start, self.model_name, messages, content, _openai_usage(resp.usage))
+            return content
         # Fallback to Ollama
-        payload: Dict[str, Any] = {
-            "model": self.cfg.ollama_model,
-            "messages": messages,
-            "options": {"temperature": temperature},
-        }
-        with httpx.Client(timeout=120) as client:
-            r = client.post(f"{self.cfg.ollama_base_url}/api/chat", json=payload)
-            r.raise_for_status()
-            data = r.json()
-            # Ollama may stream, but final content is often in 'message'
-            if "message" in data and data["message"].get("content"):
-                return data["message"]["content"]
-            # If it's a chunked array, join contents
-            if isinstance(data, list):
-                return "".join(chunk.get("message", {}).get("content", "") for chunk in data)
-            return "" 
\ No newline at end of file
+        r = post_with_retry(
+            self._http,
+            f"{self.cfg.ollama_base_url}/api/chat",
+            _ollama_payload(self.cfg, messages, temperature, max_tokens),
+            retries=self.cfg.llm_retries,
+            backoff=self.cfg.llm_retry_backoff,
+        )
+        r.raise_for_status()
+        data = r.json()
+        content = _ollama_content(data)
+        _record_llm("llm.generate", start, self.model_name, messages, content, _ollama_usage(data))
+        return content
+
+    def generate_stream(self, messages: List[Dict[str, str]], temperature: float = 0.2,
+                        max_tokens: int = 800) -> Iterator[str]:
+        # Yields content deltas as they are produced (OpenAI SSE / Ollama NDJSON)
+        start = time.perf_counter()
+        usage: Dict[str, int] = {}
+        produced: List[str] = []
+        status = "ok"
+        try:
+            if self._client:
+                stream = self._client.chat.completions.create(
+                    model=self.cfg.openai_model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage.update(_openai_usage(chunk.usage))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        produced.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                return
+            payload = _ollama_payload(self.cfg, messages, temperature, max_tokens, stream=True)
+            # Same retry policy as post_with_retry, but only until the first piece is yielded
+            attempt = 0
+            while True:
+                try:
+                    with self._http.stream("POST", f"{self.cfg.ollama_base_url}/api/chat", json=payload) as r:
+                        if r.status_code not in RETRY_STATUS or attempt >= self.cfg.llm_retries:
+                            r.raise_for_status()
+                            for line in r.iter_lines():
+                                piece = _ollama_stream_piece(line, usage)
+                                if piece:
+                                    produced.append(piece)
+                                    yield piece
+                            return
+                except httpx.TransportError as e:
+                    if produced or attempt >= self.cfg.llm_retries or not _retryable(e):
+                        raise
+                time.sleep(_backoff_delay(self.cfg.llm_retry_backoff, attempt))
+                attempt += 1
+        except GeneratorExit:
+            status = "closed"
+            raise
+        except BaseException as e:
+            status = f"error: {type(e).__name__}"
+            raise
+        finally:
+            _record_llm("llm.stream", start, self.model_name, messages, "".join(produced), usage, status)
+
+
+class AsyncLLMClient:
+    # asyncio counterpart of LLMClient; owns one AsyncClient pool for its lifetime (aclose() it)
+    def __init__(self, cfg: AppConfig | None = None) -> None:
+        self.cfg = cfg or load_config()
+        self._http = httpx.AsyncClient(timeout=_timeout(self.cfg), limits=_limits(self.cfg))
+        self._client = None
+        if self.cfg.openai_api_key and _has_openai:
+            self._client = AsyncOpenAI(api_key=self.cfg.openai_api_key, base_url=self.cfg.openai_api_base,
+                                       max_retries=self.cfg.llm_retries, timeout=_timeout(self.cfg),
+                                       http_client=self._http)
+
+    @property
+    def model_name(self) -> str:
+        return f"openai:{self.cfg.openai_model}" if self._client else f"ollama:{self.cfg.ollama_model}"
+
+    async def generate(self, messages: List[Dict[str, str]], temperature: float = 0.2,
+                       max_tokens: int = 800) -> str:
+        # Traced like LLMClient.generate (same span name, counters and token usage)
+        start = time.perf_counter()
+        if self._client:
+            resp = await self._client.chat.completions.create(
+                model=self.cfg.openai_model,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+            )
+            content = resp.choices[0].message.content or ""
+            _record_llm("llm.generate", start, self.model_name, messages, content, _openai_usage(resp.usage))
+            return content
+        r = await apost_with_retry(
+            self._http,
+            f"{self.cfg.ollama_base_url}/api/chat",
+            _ollama_payload(self.cfg, messages, temperature, max_tokens),
+            retries=self.cfg.llm_retries,
+            backoff=self.cfg.llm_retry_backoff,
+        )
+        r.raise_for_status()
+        data = r.json()
+        content = _ollama_content(data)
+        _record_llm("llm.generate", start, self.model_name, messages, content, _ollama_usage(data))
+        return content
+
+    async def generate_stream(self, messages: List[Dict[str, str]], temperature: float = 0.2,
+                              max_tokens: int = 800) -> AsyncIterator[str]:
+        start = time.perf_counter()
+        usage: Dict[str, int] = {}
+        produced: List[str] = []
+        status = "ok"
+        try:
+            if self._client:
+                stream = await self._client.chat.completions.create(
+                    model=self.cfg.openai_model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                    stream_options={"include_usage": True},
+                )
+                async for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage.update(_openai_usage(chunk.usage))
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        produced.append(chunk.choices[0].delta.content)
+                        yield chunk.choices[0].delta.content
+                return
+            payload = _ollama_payload(self.cfg, messages, temperature, max_tokens, stream=True)
+            attempt = 0
+            while True:
+                try:
+                    async with self._http.stream("POST", f"{self.cfg.ollama_base_url}/api/chat", json=payload) as r:
+                        if r.status_code not in RETRY_STATUS or attempt >= self.cfg.llm_retries:
+                            r.raise_for_status()
+                            async for line in r.aiter_lines():
+                                piece = _ollama_stream_piece(line, usage)
+                                if piece:
+                                    produced.append(piece)
+                                    yield piece
+                            return
+                except httpx.TransportError as e:
+                    if produced or attempt >= self.cfg.llm_retries or not _retryable(e):
+                        raise
+                await asyncio.sleep(_backoff_delay(self.cfg.llm_retry_backoff, attempt))
+                attempt += 1
+        except GeneratorExit:
+            status = "closed"
+            raise
+        except BaseException as e:
+            status = f"error: {type(e).__name__}"
+            raise
+        finally:
+            _record_llm("llm.stream", start, self.model_name, messages, "".join(produced), usage, status)
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+STUB_REPLY = json.dumps([
+    {
+        "section_hint": "Jurisdiction",
+        "issue": "Governing law clause does not reference ADGM Courts",
+        "severity": "High",
+        "suggestion": "Refer disputes to the ADGM Courts.",
+        "citation": "ADGM Companies Regulations 2020",
+    },
+])
+
+
+class StubLLMClient:
+    # Offline stand-in (LLM_PROVIDER=stub): answers every prompt with a fixed issue list and
+    # makes no network calls, so the analyzer, batch mode and service run without a model
+    def __init__(self, cfg: AppConfig | None = None, reply: str = STUB_REPLY) -> None:
+        self.cfg = cfg or load_config()
+        self.reply = reply
+
+    @property
+    def model_name(self) -> str:
+        return "stub"
+
+    def generate(self, messages: List[Dict[str, str]], temperature: float = 0.2, max_tokens: int = 800) -> str:
+        _record_llm("llm.generate", time.perf_counter(), self.model_name, messages, self.reply, {})
+        return self.reply
+
+    def generate_stream(self, messages: List[Dict[str, str]], temperature: float = 0.2,
+                        max_tokens: int = 800) -> Iterator[str]:
+        start = time.perf_counter()
+        for i in range(0, len(self.reply), 64):
+            yield self.reply[i:i + 64]
+        _record_llm("llm.stream", start, self.model_name, messages, self.reply, {})
+
+
+def get_llm_client() -> "LLMClient | StubLLMClient":
+    # Long-lived client shared by the analyzer; rebuilt only when the configuration changes
+    global _llm_client
+    cfg = load_config()
+    with _lock:
+        client = _llm_client
+    if client is None or client.cfg != cfg:
+        client = StubLLMClient(cfg) if cfg.llm_provider == "stub" else LLMClient(cfg)
+        with _lock:
+            _llm_client = client
+    return client
@@ -0,0 +1,81 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Tuple
+import numpy as np
+
+# In-process CPU embeddings for air-gapped use: character 3-5-grams (word boundaries included,
+# so short phrases and word order leak in) are hashed into `dim` signed buckets, counts are
+# damped with log1p and rows L2-normalised. Hashing runs over a whole batch at once with numpy
+# (rolling polynomial hashes over one concatenated byte array), so there is no per-token Python
+# loop; large batches are split across `threads` (numpy releases the GIL). Vectors are stable
+# across processes and machines, so a persisted index stays valid.
+
+NGRAMS = (3, 4, 5)
+_PRIME = np.uint64(0x100000001B3)
+_MIX = np.uint64(0x9E3779B97F4A7C15)
+
+# lower-case ASCII letters/digits; everything else (punctuation, whitespace) becomes a space
+_TABLE = bytes((c + 32 if 65 <= c <= 90 else c) if (48 <= c <= 57 or 65 <= c <= 90 or 97 <= c <= 122 or c >= 128)
+               else 32 for c in range(256))
+
+
+def parse_model(name: str) -> int:
+    # "local" or "local:<dim>" (also "local:hash-<dim>") -> dim
+    spec = name.split(":", 1)[1] if ":" in name else ""
+    digits = "".join(ch for ch in spec if ch.isdigit())
+    return int(digits) if digits else 384
+
+
+class HashingEmbedder:
+    def __init__(self, dim: int = 384, threads: int = 4, batch_size: int = 256) -> None:
+        self.dim = max(8, dim)
+        self.threads = max(1, threads)
+        self.batch_size = max(1, batch_size)
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        n = len(texts)
+        # " text " per row so the first and last words get boundary n-grams too
+        encoded = [(" " + " ".join(t.split()) + " ").encode("utf-8", "ignore").translate(_TABLE) for t in texts]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=n)
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+        row_of = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        out = np.zeros(n * self.dim, dtype=np.float32)
+        h = np.zeros(len(data), dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            for width in range(1, max(NGRAMS) + 1):
+                # h[i] = hash of data[i:i+width]
+                m = len(data) - width + 1
+                if m <= 0:
+                    break
+                h = h[:m] * _PRIME + data[width - 1:width - 1 + m]
+                if width not in NGRAMS:
+                    continue
+                valid = row_of[:m] == row_of[width - 1:width - 1 + m]  # n-gram within one text
+                mixed = (h[valid] + np.uint64(width)) * _MIX
+                bucket = (mixed >> np.uint64(40)) % np.uint64(self.dim)
+                sign = np.where((mixed >> np.uint64(63)) == 1, -1.0, 1.0)
+                out += np.bincount(row_of[:m][valid] * self.dim + bucket.astype(np.int64), weights=sign,
+                                   minlength=n * self.dim).astype(np.float32)
+        vecs = out.reshape(n, self.dim)
+        vecs = np.sign(vecs) * np.log1p(np.abs(vecs))
+        norms = np.linalg.norm(vecs, axis=1, keepdims=True) + 1e-12
+        return (vecs / norms).astype(np.float32)
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, self.dim), dtype=np.float32)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if self.threads == 1 or len(batches) == 1:
+            return np.vstack([self._embed_batch(b) for b in batches])
+        with ThreadPoolExecutor(max_workers=min(self.threads, len(batches))) as pool:
+            return np.vstack(list(pool.map(self._embed_batch, batches)))
+
+
+_embedders: Dict[Tuple[int, int], HashingEmbedder] = {}
+
+
+def get_local_embedder(dim: int, threads: int) -> HashingEmbedder:
+    key = (dim, threads)
+    if key not in _embedders:
+        _embedders[key] = HashingEmbedder(dim, threads)
+    return _embedders[key]
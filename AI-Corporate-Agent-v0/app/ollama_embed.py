@@ -0,0 +1,73 @@
+from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict
+import numpy as np
+import httpx
+
+from app.llm import post_with_retry
+
+# base_url -> whether the batch /api/embed endpoint exists (older Ollama only has /api/embeddings)
+_batch_supported: Dict[str, bool] = {}
+
+
+class OllamaEmbedder:
+    # Embeds texts with bounded concurrency: texts are cut into batches for /api/embed and up
+    # to `concurrency` batches are in flight at once; transient failures retry with backoff.
+    def __init__(self, base_url: str, model: str, batch_size: int = 32, concurrency: int = 4,
+                 retries: int = 3, backoff: float = 0.5, timeout: float = 120,
+                 client: httpx.Client | None = None) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._client = client
+
+    def _post(self, client: httpx.Client, path: str, payload: Dict) -> httpx.Response:
+        return post_with_retry(client, f"{self.base_url}{path}", payload, retries=self.retries, backoff=self.backoff)
+
+    def _embed_batch(self, client: httpx.Client, batch: List[str]) -> List[List[float]]:
+        if _batch_supported.get(self.base_url, True):
+            r = self._post(client, "/api/embed", {"model": self.model, "input": batch})
+            if r.status_code == 404 and "model" not in r.text.lower():
+                _batch_supported[self.base_url] = False
+            else:
+                r.raise_for_status()
+                embs = r.json().get("embeddings")
+                if not embs or len(embs) != len(batch):
+                    raise RuntimeError("Ollama /api/embed response missing 'embeddings'")
+                _batch_supported[self.base_url] = True
+                return embs
+        vecs: List[List[float]] = []
+        for t in batch:
+            r = self._post(client, "/api/embeddings", {"model": self.model, "prompt": t})
+            r.raise_for_status()
+            data = r.json()
+            emb = data.get("embedding") or data.get("data", [{}])[0].get("embedding")
+            if not emb:
+                raise RuntimeError("Ollama embedding response missing 'embedding'")
+            vecs.append(emb)
+        return vecs
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        batches = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        client = self._client or httpx.Client(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        try:
+            if len(batches) == 1 or self.concurrency == 1:
+                results = [self._embed_batch(client, b) for b in batches]
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.concurrency, len(batches))) as pool:
+                    results = list(pool.map(lambda b: self._embed_batch(client, b), batches))
+        finally:
+            if self._client is None:
+                client.close()
+        arr = np.asarray([v for part in results for v in part], dtype=np.float32)
+        norms = np.linalg.norm(arr, axis=1, keepdims=True) + 1e-12
+        return arr / norms
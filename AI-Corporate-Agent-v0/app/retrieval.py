@@ -1,30 +1,207 @@
 from __future__ import annotations
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from pathlib import Path
+import re
 
+import numpy as np
+
+from app.config import load_config
+from app.bm25 import reciprocal_rank_fusion
 from app.ingest import ensure_index
+from app import tracing
+
+# A clause starts at a numbered heading ("1.", "3.2", "(a)", "Article 5", "Clause 7") or after a blank line
+_CLAUSE_BREAK = re.compile(
+    r"\n\s*\n|\n(?=\s*(?:\d+(?:\.\d+)*[.)]\s|\([a-z0-9ivx]+\)\s|(?:article|clause|section|part)\s+\d+))",
+    re.I,
+)
+_HEADING = re.compile(r"(?:\d+(?:\.\d+)*[.)]\s|\([a-z0-9ivx]+\)\s|(?:article|clause|section|part)\s+\d+)", re.I)
+
+# Rough BPE-style count: one token per short word or punctuation mark, long words count extra
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text: str) -> int:
+    return sum(1 + (len(t) - 1) // 6 for t in _TOKEN_RE.findall(text))
+
 
+def _hit_context(h: Dict) -> Dict:
+    # Position fields let the packer merge neighbouring chunks of the same source
+    return {
+        "source": h.get("source", "unknown"),
+        "page": h.get("page"),
+        "chunk_index": h.get("chunk_index"),
+        "score": h["score"],
+        "text": h.get("text", ""),
+    }
 
-def retrieve_context(question: str, k: int = 6) -> List[Dict]:
-    vs = ensure_index()
+
+def retrieve_context(question: str, k: int = 6, partition: str = "") -> List[Dict]:
+    vs = ensure_index(partition)
     hits = vs.similarity_search(question, k=k)
+    return [_hit_context(h) for h in hits]
+
+
+def _clause_label(clause: str, max_label: int = 60) -> str:
+    # The clause's own heading line as written in the document ("5. Directors", "Article 5"),
+    # so a section_hint that repeats it can be found verbatim when annotating; "" if unnumbered
+    if not _HEADING.match(clause):
+        return ""
+    line = clause.split("\n", 1)[0].strip()
+    return line if len(line) <= max_label else line[:max_label].rsplit(" ", 1)[0]
+
+
+def _windows(text: str, max_chars: int) -> List[str]:
+    # Cut at whitespace into pieces of at most max_chars, so no part of a long clause is lost
+    out: List[str] = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        cut = cut if cut > max_chars // 2 else max_chars
+        out.append(text[:cut].strip())
+        text = text[cut:].strip()
+    if text:
+        out.append(text)
+    return out
+
+
+def split_clauses(text: str, min_chars: int = 80, max_chars: int = 1500,
+                  budget_chars: int | None = None) -> List[Tuple[str, str]]:
+    # Returns (label, query) pairs: every natural clause, long ones split into max_chars windows
+    # that share the clause's label. Queries beyond budget_chars in total are not searched.
+    if budget_chars is None:
+        budget_chars = load_config().retrieval_clause_budget
+    pieces = [p.strip() for p in _CLAUSE_BREAK.split(text) if p and p.strip()]
+    clauses: List[str] = []
+    for piece in pieces:
+        # Headings and one-liners are folded into the following text
+        if clauses and len(clauses[-1]) < min_chars:
+            clauses[-1] = f"{clauses[-1]}\n{piece}"
+        else:
+            clauses.append(piece)
+    queries: List[Tuple[str, str]] = []
+    used = 0
+    for clause in clauses:
+        label = _clause_label(clause)
+        for window in _windows(clause, max_chars):
+            if budget_chars > 0 and used + len(window) > budget_chars:
+                tracing.drop("clause_budget_exceeded", searched_chars=used, total_chars=len(text))
+                return queries
+            queries.append((label, window))
+            used += len(window)
+    return queries
+
+
+def retrieve_for_document(text: str, k: int = 6, per_clause_k: int = 3, max_clauses_per_hit: int = 3,
+                          partition: str = "") -> List[Dict]:
+    # Clause-grounded retrieval: every clause of the uploaded document is a query. Per-query
+    # scores (RRF in hybrid mode) are not comparable across queries, so hits are merged by a
+    # second reciprocal-rank fusion over the per-clause result lists; each hit remembers the
+    # clauses that ranked it highest.
+    clauses = split_clauses(text)
+    if not clauses:
+        return []
+    vs = ensure_index(partition)
+    results = vs.similarity_search_batch([q for _label, q in clauses], k=per_clause_k)
+    hits_by_id: Dict[int, Dict] = {}
+    supports: Dict[int, List[Dict]] = {}
+    rankings: List[np.ndarray] = []
+    for clause_no, hits in enumerate(results):
+        rankings.append(np.array([h["id"] for h in hits], dtype=np.int64))
+        label, query = clauses[clause_no]
+        for rank, h in enumerate(hits):
+            hits_by_id.setdefault(h["id"], h)
+            supports.setdefault(h["id"], []).append(
+                {"clause": clause_no + 1, "label": label, "rank": rank, "excerpt": query[:200]})
+    ids, scores = reciprocal_rank_fusion(rankings, k, rrf_k=load_config().rrf_k)
     contexts: List[Dict] = []
-    for h in hits:
-        contexts.append({
-            "source": h.get("source", "unknown"),
-            "score": h["score"],
-            "text": h.get("text", "")[:3000],
-        })
+    for doc_id, score in zip(ids.tolist(), scores.tolist()):
+        best = sorted(supports[doc_id], key=lambda c: (c["rank"], c["clause"]))[:max_clauses_per_hit]
+        contexts.append({**_hit_context(hits_by_id[doc_id]), "score": score,
+                         "clauses": sorted(best, key=lambda c: c["clause"])})
     return contexts
 
 
-def build_rag_prompt(user_task: str, contexts: List[Dict]) -> str:
+def _overlap(a: str, b: str, max_overlap: int = 600) -> int:
+    # Length of the longest suffix of `a` that is a prefix of `b` (the splitter's chunk_overlap)
+    for n in range(min(len(a), len(b), max_overlap), 0, -1):
+        if a.endswith(b[:n]):
+            return n
+    return 0
+
+
+def _merge_adjacent(contexts: List[Dict]) -> List[Dict]:
+    # Consecutive chunks of the same source/page become one passage (shared overlap kept once)
+    ordered = sorted(
+        enumerate(contexts),
+        key=lambda ic: (str(ic[1].get("source")), ic[1].get("page") or 0,
+                        ic[1]["chunk_index"] if ic[1].get("chunk_index") is not None else -1, ic[0]),
+    )
+    merged: List[Dict] = []
+    for _, c in ordered:
+        prev = merged[-1] if merged else None
+        if (prev is not None and c.get("chunk_index") is not None and prev.get("chunk_index") is not None
+                and prev["source"] == c["source"] and prev.get("page") == c.get("page")
+                and c["chunk_index"] - prev["chunk_index"] in (0, 1)):
+            if c["chunk_index"] != prev["chunk_index"]:
+                cut = _overlap(prev["text"], c["text"])
+                prev["text"] = prev["text"] + ("" if cut else "\n") + c["text"][cut:]
+                prev["chunk_index"] = c["chunk_index"]
+                tracing.count("context.chunks_merged")
+            prev["score"] = max(prev["score"], c["score"])
+            if c.get("clauses"):
+                prev["clauses"] = sorted(prev.get("clauses", []) + c["clauses"], key=lambda cl: cl["clause"])
+            continue
+        merged.append(dict(c))
+    return merged
+
+
+def _dedupe(contexts: List[Dict]) -> List[Dict]:
+    # Best-scored first; a passage whose text already appears inside a kept one is dropped
+    kept: List[Tuple[str, Dict]] = []
+    for c in sorted(contexts, key=lambda c: -c["score"]):
+        norm = " ".join(c["text"].split()).lower()
+        if any(norm in k for k, _ in kept):
+            tracing.count("context.duplicates")
+            continue
+        kept.append((norm, c))
+    return [c for _, c in kept]
+
+
+def pack_contexts(contexts: List[Dict], budget_tokens: int | None = None) -> List[Dict]:
+    # Merge neighbouring chunks, drop duplicate passages, then fill the token budget by score.
+    # Passages that do not fit are skipped in favour of smaller ones; if even the best one does
+    # not fit it is cut to the budget. budget_tokens <= 0 keeps everything.
+    if budget_tokens is None:
+        budget_tokens = load_config().context_token_budget
+    packed: List[Dict] = []
+    used = 0
+    for c in _dedupe(_merge_adjacent(contexts)):
+        tokens = estimate_tokens(c["text"])
+        if budget_tokens <= 0 or used + tokens <= budget_tokens:
+            packed.append({**c, "tokens": tokens})
+            used += tokens
+        elif not packed:
+            keep = int(len(c["text"]) * budget_tokens / max(1, tokens))
+            packed.append({**c, "text": c["text"][:keep], "tokens": budget_tokens})
+            used = budget_tokens
+    tracing.count("context.tokens", used)
+    return packed
+
+
+def build_rag_prompt(user_task: str, contexts: List[Dict], budget_tokens: int | None = None) -> str:
     header = (
         "You are an expert ADGM corporate paralegal. Use only the provided context to assess compliance.\n"
         "Cite the exact regulation or the source document name where relevant.\n"
     )
     ctx_blocks = []
-    for i, c in enumerate(contexts, 1):
+    for i, c in enumerate(pack_contexts(contexts, budget_tokens), 1):
         name = Path(str(c.get('source','context'))).name
-        ctx_blocks.append(f"[Source {i}: {name}]\n{c['text']}")
-    return header + "\n\n" + "\n\n".join(ctx_blocks) + "\n\nUser task:\n" + user_task 
\ No newline at end of file
+        if c.get("page"):
+            name += f", page {c['page']}"
+        block = f"[Source {i}: {name}]\n{c['text']}"
+        if c.get("clauses"):
+            refs = "\n".join(f"- \"{cl['label']}\": {cl['excerpt']}" if cl.get("label") else f"- {cl['excerpt']}"
+                             for cl in c["clauses"])
+            block += f"\nRelevant to uploaded document clauses:\n{refs}"
+        ctx_blocks.append(block)
+    return header + "\n\n" + "\n\n".join(ctx_blocks) + "\n\nUser task:\n" + user_task
\ No newline at end of file
@@ -0,0 +1,140 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+import json
+import re
+
+from app.config import load_config
+
+DEFAULT_RULES_PATH = str(Path(__file__).with_name("rules.json"))
+
+
+@dataclass(frozen=True)
+class RuleHit:
+    rule_id: str
+    start: int
+    end: int
+    text: str
+    in_name: bool = False
+
+
+MAX_EVIDENCE = 5
+
+
+class RuleSet:
+    # Each rule is compiled once and only searched as far as its kind needs: classification
+    # and official markers look at the head of the document (their configured windows), and
+    # red flags stop at the first match ("absent") or after MAX_EVIDENCE hits ("present").
+    # Only classification rules apply to the file name.
+    def __init__(self, spec: Dict[str, Any]) -> None:
+        self.spec = spec
+        self.rules: List[Dict[str, Any]] = list(spec.get("rules", []))
+        self.by_id: Dict[str, Dict[str, Any]] = {r["id"]: r for r in self.rules}
+        windows = {
+            "classify": spec.get("classification", {}).get("window", 4000),
+            "official_marker": spec.get("official", {}).get("window", 8000),
+        }
+        self._compiled: List[Tuple[Dict[str, Any], Any, int | None, int]] = []
+        for rule in self.rules:
+            flags = 0 if rule.get("case_sensitive") else re.I
+            limit = MAX_EVIDENCE if rule["kind"] == "red_flag" and rule.get("when", "present") == "present" else 1
+            self._compiled.append((rule, re.compile(rule["pattern"], flags), windows.get(rule["kind"]), limit))
+
+    def scan(self, text: str, in_name: bool = False) -> List[RuleHit]:
+        hits: List[RuleHit] = []
+        for rule, pattern, window, limit in self._compiled:
+            if in_name and rule["kind"] != "classify":
+                continue
+            end = len(text) if in_name or window is None else min(window, len(text))
+            for m in islice(pattern.finditer(text, 0, end), limit):
+                hits.append(RuleHit(rule["id"], m.start(), m.end(), m.group(0), in_name))
+        return hits
+
+
+@dataclass(frozen=True)
+class ScanResult:
+    # Not every occurrence: per rule, the first hit inside its window (MAX_EVIDENCE hits for
+    # "present" red flags), which is all the checks below need
+    hits: Tuple[RuleHit, ...]
+    text_length: int
+
+    def of_kind(self, rules: RuleSet, kind: str) -> List[RuleHit]:
+        return [h for h in self.hits if rules.by_id[h.rule_id]["kind"] == kind]
+
+
+@lru_cache(maxsize=8)
+def _load_rules(path: str, mtime_ns: int) -> RuleSet:
+    return RuleSet(json.loads(Path(path).read_text(encoding="utf-8")))
+
+
+def get_rules() -> RuleSet:
+    path = load_config().rules_path or DEFAULT_RULES_PATH
+    return _load_rules(path, Path(path).stat().st_mtime_ns)
+
+
+@lru_cache(maxsize=128)
+def _scan_cached(rules: RuleSet, text: str, name: str) -> ScanResult:
+    hits = rules.scan(name, in_name=True) if name else []
+    hits.extend(rules.scan(text))
+    return ScanResult(tuple(hits), len(text))
+
+
+def scan_document(text: str, name: str = "") -> ScanResult:
+    # Each rule searched once over its window of the document (classification rules also over
+    # the file name); memoized so the UI banner, the classifier, the format check and the
+    # red-flag checks all share it.
+    return _scan_cached(get_rules(), text, name)
+
+
+def classify_from_scan(result: ScanResult, rules: RuleSet | None = None) -> Tuple[str, float]:
+    rules = rules or get_rules()
+    settings = rules.spec.get("classification", {})
+    window = settings.get("window", 4000)
+    matched = {h.rule_id for h in result.of_kind(rules, "classify") if h.in_name or h.end <= window}
+    # Rule order in the file is the priority order
+    for rule in rules.rules:
+        if rule["kind"] == "classify" and rule["id"] in matched:
+            return rule["label"], settings.get("confidence", 0.9)
+    return "Unknown", settings.get("unknown_confidence", 0.2)
+
+
+def official_from_scan(result: ScanResult, rules: RuleSet | None = None) -> Tuple[bool, str]:
+    rules = rules or get_rules()
+    settings = rules.spec.get("official", {})
+    window = settings.get("window", 8000)
+    groups: Dict[str, set] = {}
+    for h in result.of_kind(rules, "official_marker"):
+        if not h.in_name and h.end <= window:
+            groups.setdefault(rules.by_id[h.rule_id].get("group", "core"), set()).add(h.rule_id)
+    hits = len(groups.get("core", ()))
+    url_hits = len(groups.get("url", ()))
+    # Heuristic: require at least two core markers OR one core + one url/contact marker
+    if hits >= settings.get("min_core", 2) or (hits >= settings.get("min_core_with_url", 1) and url_hits >= 1):
+        return True, "Detected ADGM header markers"
+    return False, "No clear ADGM official markers found"
+
+
+def red_flags_from_scan(result: ScanResult, rules: RuleSet | None = None,
+                        max_evidence: int = MAX_EVIDENCE) -> List[Dict[str, Any]]:
+    rules = rules or get_rules()
+    by_rule: Dict[str, List[RuleHit]] = {}
+    for h in result.of_kind(rules, "red_flag"):
+        if not h.in_name:
+            by_rule.setdefault(h.rule_id, []).append(h)
+    issues: List[Dict[str, Any]] = []
+    for rule in rules.rules:
+        if rule["kind"] != "red_flag":
+            continue
+        found = by_rule.get(rule["id"], [])
+        if rule.get("when", "present") == "absent":
+            if not found:
+                issues.append(dict(rule["issue"]))
+        elif found:
+            issue = dict(rule["issue"])
+            # Offsets into the extracted text let annotation find the exact wording
+            issue["evidence"] = [{"start": h.start, "end": h.end, "text": h.text} for h in found[:max_evidence]]
+            issues.append(issue)
+    return issues
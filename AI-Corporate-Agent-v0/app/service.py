@@ -0,0 +1,253 @@
+from __future__ import annotations
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Tuple
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+from fastapi import FastAPI, File, HTTPException, UploadFile
+from fastapi.responses import StreamingResponse
+
+from app.analyzer import analyze_documents
+from app.config import AppConfig, load_config
+from app.doc_cache import parse_document, parse_documents
+from app.ingest import ensure_index
+from app.llm import get_llm_client
+from app.zip_output import iter_review_zip, review_items
+from app import tracing
+
+TERMINAL = {"done", "failed", "cancelled"}
+
+
+class Job:
+    def __init__(self, files: List[Tuple[str, bytes]]) -> None:
+        self.id = uuid.uuid4().hex
+        self.files = files
+        self.status = "queued"
+        self.created = time.time()
+        self.started: float | None = None
+        self.finished: float | None = None
+        self.report: Dict[str, Any] | None = None
+        self.error: str | None = None
+        self.events: List[Dict[str, Any]] = []
+        self.cancel = threading.Event()
+        self._changed = asyncio.Event()
+
+    def push(self, event: Dict[str, Any]) -> None:
+        # Loop thread only: append and wake every streaming reader
+        self.events.append(event)
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def set_status(self, status: str, **extra: Any) -> None:
+        self.status = status
+        if status == "running":
+            self.started = time.time()
+        if status in TERMINAL:
+            self.finished = time.time()
+            if status != "done":
+                # Only finished reviews keep their uploads (for result.zip)
+                self.files = [(name, b"") for name, _ in self.files]
+        self.push({"event": "status", "status": status, **extra})
+
+    async def stream(self) -> AsyncIterator[Dict[str, Any]]:
+        sent = 0
+        while True:
+            changed = self._changed
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.status in TERMINAL:
+                return
+            await changed.wait()
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "files": [name for name, _ in self.files],
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "issues_found": sum(1 for e in self.events if e["event"] == "issue"),
+            "error": self.error,
+            "report": self.report,
+        }
+
+
+class JobManager:
+    # Bounded in-process queue drained by a fixed set of worker tasks. Each review runs in a
+    # thread (analyze_documents is blocking) against the process-wide index and LLM client, and
+    # issues are pushed back onto the event loop as they are found.
+    def __init__(self, workers: int = 2, queue_size: int = 32, keep_jobs: int = 200) -> None:
+        self.workers = max(1, workers)
+        self.queue: "asyncio.Queue[Job]" = asyncio.Queue(maxsize=max(1, queue_size))
+        self.keep_jobs = keep_jobs
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for job in self.jobs.values():
+            job.cancel.set()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def submit(self, files: List[Tuple[str, bytes]]) -> Job:
+        job = Job(files)
+        self.queue.put_nowait(job)  # raises asyncio.QueueFull when saturated
+        self.jobs[job.id] = job
+        self._prune()
+        return job
+
+    def cancel(self, job: Job) -> None:
+        if job.status in TERMINAL:
+            return
+        job.cancel.set()
+        if job.status == "queued":
+            # Still waiting: the worker will drop it when dequeued
+            job.set_status("cancelled")
+
+    def _prune(self) -> None:
+        finished = [j.id for j in self.jobs.values() if j.status in TERMINAL]
+        for job_id in finished[:max(0, len(self.jobs) - self.keep_jobs)]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self.queue.get()
+            try:
+                if job.cancel.is_set():
+                    continue
+                job.set_status("running")
+                try:
+                    report = await asyncio.to_thread(self._review, job, loop)
+                except Exception as e:
+                    job.error = f"{type(e).__name__}: {e}"
+                    job.set_status("failed", error=job.error)
+                    continue
+                if job.cancel.is_set():
+                    job.set_status("cancelled")
+                else:
+                    job.report = report
+                    job.push({"event": "report", "report": report})
+                    job.set_status("done")
+            finally:
+                self.queue.task_done()
+
+    def _review(self, job: Job, loop: asyncio.AbstractEventLoop) -> Dict[str, Any]:
+        with tracing.trace("job"):
+            return self._run_review(job, loop)
+
+    def _run_review(self, job: Job, loop: asyncio.AbstractEventLoop) -> Dict[str, Any]:
+        parsed = parse_documents(job.files)
+        docs = [(name, p.text) for (name, _), p in zip(job.files, parsed)]
+
+        def on_issue(index: int, issue: Dict[str, Any]) -> None:
+            if not job.cancel.is_set():
+                loop.call_soon_threadsafe(job.push, {"event": "issue", "index": index,
+                                                     "file": docs[index][0], "issue": issue})
+
+        return analyze_documents(docs, on_issue=on_issue, cancel=job.cancel)
+
+
+def _warm(cfg: AppConfig) -> Dict[str, Any]:
+    # Load (or build) the reference index and create the shared LLM client once, up front,
+    # so the first job does not pay for it
+    state: Dict[str, Any] = {"llm": get_llm_client().model_name}
+    try:
+        vs = ensure_index()
+        state["index_chunks"] = len(vs.texts)
+    except Exception as e:
+        state["index_error"] = f"{type(e).__name__}: {e}"
+    return state
+
+
+def create_app(cfg: AppConfig | None = None) -> FastAPI:
+    cfg = cfg or load_config()
+    warm: Dict[str, Any] = {}
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        manager = JobManager(cfg.service_workers, cfg.service_queue_size, cfg.service_keep_jobs)
+        app.state.jobs = manager
+        warm.update(await asyncio.to_thread(_warm, cfg))
+        manager.start()
+        yield
+        await manager.stop()
+
+    app = FastAPI(title="ADGM Corporate Agent", lifespan=lifespan)
+
+    def _job(app_state, job_id: str) -> Job:
+        job = app_state.jobs.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail="Unknown job")
+        return job
+
+    @app.get("/health")
+    async def health() -> Dict[str, Any]:
+        manager: JobManager = app.state.jobs
+        return {"status": "ok", "queued": manager.queue.qsize(), "queue_size": manager.queue.maxsize,
+                "workers": manager.workers, **warm}
+
+    @app.post("/jobs", status_code=202)
+    async def submit(files: List[UploadFile] = File(...)) -> Dict[str, Any]:
+        manager: JobManager = app.state.jobs
+        if manager.queue.full():
+            raise HTTPException(status_code=429, detail="Review queue is full", headers={"Retry-After": "5"})
+        payload: List[Tuple[str, bytes]] = []
+        for f in files:
+            name = Path(f.filename or "").name
+            if Path(name).suffix.lower() != ".docx":
+                raise HTTPException(status_code=415, detail=f"Only .docx files are accepted: {name!r}")
+            payload.append((name, await f.read()))
+        try:
+            job = manager.submit(payload)
+        except asyncio.QueueFull:
+            raise HTTPException(status_code=429, detail="Review queue is full", headers={"Retry-After": "5"})
+        return {"job_id": job.id, "status": job.status}
+
+    @app.get("/jobs/{job_id}")
+    async def status(job_id: str) -> Dict[str, Any]:
+        return _job(app.state, job_id).summary()
+
+    @app.get("/jobs/{job_id}/events")
+    async def events(job_id: str) -> StreamingResponse:
+        # NDJSON: status changes and issues as they are found, then the report
+        job = _job(app.state, job_id)
+
+        async def body() -> AsyncIterator[bytes]:
+            async for event in job.stream():
+                yield (json.dumps(event) + "\n").encode("utf-8")
+
+        return StreamingResponse(body(), media_type="application/x-ndjson")
+
+    @app.get("/jobs/{job_id}/result.zip")
+    async def result_zip(job_id: str) -> StreamingResponse:
+        # Reviewed documents are annotated into the archive while it is being sent
+        job = _job(app.state, job_id)
+        if job.status != "done" or job.report is None:
+            raise HTTPException(status_code=409, detail=f"Job is {job.status}")
+        # Parsing is CPU-bound; keep it off the event loop
+        parsed = await asyncio.to_thread(lambda: [parse_document(name, data) for name, data in job.files])
+        return StreamingResponse(
+            iter_review_zip(review_items(parsed, job.report), job.report),
+            media_type="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="adgm_review_{job.id}.zip"'},
+        )
+
+    @app.delete("/jobs/{job_id}")
+    async def cancel(job_id: str) -> Dict[str, Any]:
+        job = _job(app.state, job_id)
+        app.state.jobs.cancel(job)
+        return {"job_id": job.id, "status": job.status}
+
+    return app
@@ -1,11 +1,14 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Tuple
+from bisect import bisect_right
+from typing import Callable, Iterator, List, Tuple
 import re
 
 from docx import Document  # type: ignore
 from PyPDF2 import PdfReader  # type: ignore
 
+ParagraphSpan = Tuple[int, int, List[int]]
+
 
 def extract_text_with_metadata(path: str) -> Tuple[str, dict]:
     p = Path(path)
@@ -20,27 +23,86 @@ def extract_text_with_metadata(path: str) -> Tuple[str, dict]:
 
 
 def _extract_docx(p: Path) -> str:
-    doc = Document(str(p))
-    parts = []
+    return docx_layout(Document(str(p)))[0]
+
+
+def docx_layout(doc) -> Tuple[str, List[ParagraphSpan]]:
+    # Extracted text plus, for every body paragraph, its (start, end) offsets in that text and
+    # the lengths of its runs (empty when the runs do not tile the paragraph text, e.g. when
+    # part of it sits in a hyperlink), so hits in the text can be mapped back onto runs.
+    parts: List[str] = []
+    spans: List[Tuple[int, int, List[int]]] = []
+    pos = 0
     for para in doc.paragraphs:
-        parts.append(para.text)
+        t = para.text
+        runs = [len(r.text) for r in para.runs]
+        if sum(runs) != len(t):
+            runs = []
+        spans.append((pos, pos + len(t), runs))
+        parts.append(t)
+        pos += len(t) + 1
     # Include tables
     for table in doc.tables:
         for row in table.rows:
             parts.append("\t".join(cell.text for cell in row.cells))
-    text = "\n".join(parts)
-    text = re.sub(r"\n{3,}", "\n\n", text)
-    return text
+    text, remap = _collapse_blank_lines("\n".join(parts))
+    layout: List[ParagraphSpan] = []
+    for start, end, runs in spans:
+        s, e = remap(start), remap(end)
+        layout.append((s, e, runs if e - s == end - start else []))
+    return text, layout
 
 
-def _extract_pdf(p: Path) -> str:
+def _collapse_blank_lines(raw: str) -> Tuple[str, Callable[[int], int]]:
+    # Same result as re.sub(r"\n{3,}", "\n\n", raw), plus a map from raw to collapsed offsets
+    out: List[str] = []
+    starts: List[int] = []
+    ends: List[int] = []
+    shifts: List[int] = []
+    last = removed = 0
+    for m in re.finditer(r"\n{3,}", raw):
+        out.append(raw[last:m.start() + 2])
+        last = m.end()
+        starts.append(m.start() + 2)
+        ends.append(m.end())
+        shifts.append(removed)
+        removed += m.end() - m.start() - 2
+    out.append(raw[last:])
+
+    def remap(offset: int) -> int:
+        i = bisect_right(ends, offset)
+        shift = shifts[i] if i < len(shifts) else removed
+        if i < len(starts) and offset > starts[i]:
+            return starts[i] - shift
+        return offset - shift
+
+    return "".join(out), remap
+
+
+def iter_text_units(path: str) -> Iterator[Tuple[str, dict]]:
+    # PDFs are yielded page by page (with a 1-based "page" in the metadata) so large files
+    # never have to be held in memory as one string; other formats are a single unit.
+    p = Path(path)
+    if p.suffix.lower() == ".pdf":
+        for page_no, text in _iter_pdf_pages(p):
+            yield text, {"source": str(p), "type": "pdf", "page": page_no}
+        return
+    yield extract_text_with_metadata(path)
+
+
+def _iter_pdf_pages(p: Path) -> Iterator[Tuple[int, str]]:
     try:
         reader = PdfReader(str(p))
-        texts = []
-        for page in reader.pages:
-            txt = page.extract_text() or ""
-            texts.append(txt)
-        return "\n".join(texts)
+        pages = reader.pages
     except Exception:
-        # If PDF parsing fails, return empty to avoid crashing
-        return "" 
\ No newline at end of file
+        # If PDF parsing fails, yield nothing to avoid crashing
+        return
+    for page_no, page in enumerate(pages, 1):
+        try:
+            yield page_no, page.extract_text() or ""
+        except Exception:
+            continue
+
+
+def _extract_pdf(p: Path) -> str:
+    return "\n".join(text for _, text in _iter_pdf_pages(p)) 
\ No newline at end of file
@@ -0,0 +1,237 @@
+from __future__ import annotations
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+import json
+import threading
+import time
+import uuid
+
+from app.config import load_config
+
+# Lightweight in-process tracing. A Trace collects spans (timed stages), counters and the
+# reasons AI issues were dropped; the active trace, parent span and document travel in
+# context variables, and propagate() carries them into worker threads; work in pool processes
+# records into capture() and is folded back with merge(). With no active trace every helper
+# is a cheap no-op.
+
+_trace: ContextVar["Trace | None"] = ContextVar("trace", default=None)
+_parent: ContextVar["str | None"] = ContextVar("trace_parent", default=None)
+_document: ContextVar["str | None"] = ContextVar("trace_document", default=None)
+
+
+class Trace:
+    def __init__(self, name: str) -> None:
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = 0.0
+        self.spans: List[Dict[str, Any]] = []
+        self.counters: Dict[str, float] = {}
+        self.drops: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+
+    def add_span(self, span: Dict[str, Any]) -> None:
+        with self._lock:
+            self.spans.append(span)
+
+    def count(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def drop(self, reason: str, **attrs: Any) -> None:
+        with self._lock:
+            self.drops.append({"reason": reason, **attrs})
+
+    def state(self) -> Dict[str, Any]:
+        # Picklable snapshot, for a trace captured in a worker process (see capture/merge)
+        with self._lock:
+            return {"started": self.started, "spans": list(self.spans), "counters": dict(self.counters),
+                    "drops": list(self.drops)}
+
+    def summary(self) -> Dict[str, Any]:
+        # Per-stage and per-document totals for the report
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            drops = list(self.drops)
+        stages: Dict[str, Dict[str, float]] = {}
+        documents: Dict[str, Dict[str, float]] = {}
+        for s in spans:
+            st = stages.setdefault(s["name"], {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+            st["count"] += 1
+            st["total_ms"] += s["duration_ms"]
+            st["max_ms"] = max(st["max_ms"], s["duration_ms"])
+            if s.get("document"):
+                doc = documents.setdefault(s["document"], {})
+                doc[s["name"]] = round(doc.get(s["name"], 0.0) + s["duration_ms"], 3)
+        for st in stages.values():
+            st["total_ms"] = round(st["total_ms"], 3)
+            st["max_ms"] = round(st["max_ms"], 3)
+        return {
+            "trace_id": self.trace_id,
+            "total_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "stages": stages,
+            "documents": documents,
+            "counters": {k: round(v, 3) for k, v in counters.items()},
+            "dropped_issues": drops,
+        }
+
+    def export(self, path: str) -> None:
+        # JSON lines: one record per span, then one summary record for the whole trace
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        lines = [json.dumps({"type": "span", "trace_id": self.trace_id, **s}, default=str) for s in self.spans]
+        lines.append(json.dumps({"type": "trace", "name": self.name, "started": self.started,
+                                 **self.summary()}, default=str))
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+
+
+def current() -> Trace | None:
+    return _trace.get()
+
+
+@contextmanager
+def trace(name: str) -> Iterator[Trace]:
+    # Joins the active trace if there is one; otherwise starts a new trace and, on exit,
+    # appends it to TRACE_PATH when that is configured
+    existing = _trace.get()
+    if existing is not None:
+        with span(name):
+            yield existing
+        return
+    tr = Trace(name)
+    token = _trace.set(tr)
+    try:
+        with span(name):
+            yield tr
+    finally:
+        _trace.reset(token)
+        tr.duration_ms = (time.perf_counter() - tr._t0) * 1000
+        path = load_config().trace_path
+        if path:
+            try:
+                tr.export(path)
+            except OSError:
+                pass
+
+
+@contextmanager
+def span(name: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    # Yields the span's attribute dict so callers can add results (sizes, counts) before it ends
+    tr = _trace.get()
+    if tr is None:
+        yield attrs
+        return
+    span_id = uuid.uuid4().hex[:16]
+    parent = _parent.get()
+    token = _parent.set(span_id)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attrs
+    except BaseException as e:
+        status = f"error: {type(e).__name__}"
+        raise
+    finally:
+        _parent.reset(token)
+        tr.add_span({
+            "name": name,
+            "span_id": span_id,
+            "parent": parent,
+            "document": _document.get(),
+            "start": round(start - tr._t0, 6),
+            "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+            "status": status,
+            "attrs": attrs,
+        })
+
+
+def record_span(name: str, start: float, **attrs: Any) -> None:
+    # For generators and callbacks, where a `with span()` block cannot wrap the work: records a
+    # span that began at perf_counter() value `start` and ends now
+    tr = _trace.get()
+    if tr is None:
+        return
+    tr.add_span({
+        "name": name,
+        "span_id": uuid.uuid4().hex[:16],
+        "parent": _parent.get(),
+        "document": _document.get(),
+        "start": round(start - tr._t0, 6),
+        "duration_ms": round((time.perf_counter() - start) * 1000, 3),
+        "status": attrs.pop("status", "ok"),
+        "attrs": attrs,
+    })
+
+
+@contextmanager
+def document(name: str) -> Iterator[None]:
+    # Tags every span opened inside with the document it belongs to
+    token = _document.set(name)
+    try:
+        with span("document"):
+            yield
+    finally:
+        _document.reset(token)
+
+
+def count(name: str, value: float = 1) -> None:
+    tr = _trace.get()
+    if tr is not None:
+        tr.count(name, value)
+
+
+def drop(reason: str, **attrs: Any) -> None:
+    tr = _trace.get()
+    if tr is not None:
+        attrs.setdefault("document", _document.get())
+        tr.drop(reason, **attrs)
+
+
+@contextmanager
+def capture(name: str) -> Iterator[Trace]:
+    # A detached trace for work running in another process: nothing is exported; the worker
+    # returns tr.state() and the caller folds it into its own trace with merge()
+    tr = Trace(name)
+    tokens = (_trace.set(tr), _parent.set(None), _document.set(None))
+    try:
+        yield tr
+    finally:
+        _document.reset(tokens[2])
+        _parent.reset(tokens[1])
+        _trace.reset(tokens[0])
+
+
+def merge(state: Dict[str, Any]) -> None:
+    # Adds a captured trace's spans (re-timed onto this trace's clock, top-level spans parented
+    # under the current span), counters and drops to the active trace
+    tr = _trace.get()
+    if tr is None:
+        return
+    shift = state["started"] - tr.started
+    parent = _parent.get()
+    for s in state["spans"]:
+        tr.add_span({**s, "start": round(s["start"] + shift, 6), "parent": s["parent"] or parent})
+    for name, value in state["counters"].items():
+        tr.count(name, value)
+    for d in state["drops"]:
+        tr.drop(**d)
+
+
+def propagate(fn: Callable[..., Any]) -> Callable[..., Any]:
+    # Wraps fn so it runs under the caller's trace/span/document when called from a pool thread
+    tr, parent, doc = _trace.get(), _parent.get(), _document.get()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        tokens = (_trace.set(tr), _parent.set(parent), _document.set(doc))
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _document.reset(tokens[2])
+            _parent.reset(tokens[1])
+            _trace.reset(tokens[0])
+
+    return run
@@ -1,9 +1,7 @@
 from __future__ import annotations
-import io
-import json
 from pathlib import Path
 from typing import List, Tuple
-import zipfile
+import io
 import os
 import sys
 
@@ -16,11 +14,11 @@ if PROJECT_ROOT not in sys.path:
 import streamlit as st  # type: ignore
 
 from app.config import load_config
-from app.text_extractor import extract_text_with_metadata
-from app.analyzer import analyze_documents
-from app.docx_utils import annotate_docx
-from app.ingest import ensure_index
+from app.doc_cache import parse_documents
+from app.analyzer import stream_review
+from app.ingest import refresh_index
 from app.official_check import is_official_adgm_format
+from app.zip_output import review_items, write_review_zip
 
 
 st.set_page_config(page_title="ADGM Corporate Agent", layout="wide")
@@ -33,8 +31,13 @@ with st.expander("Build/Refresh Knowledge Base (RAG)", expanded=False):
     st.write("Reference directory:", cfg.reference_dir)
     if st.button("Build/Refresh Index"):
         try:
-            ensure_index()
-            st.success("Index is ready.")
+            stats = refresh_index()
+            st.success(
+                f"Index is ready ({stats['embedded']} file(s) embedded, "
+                f"{stats['unchanged']} unchanged, {stats['removed']} removed)."
+            )
+            if "index" in stats:
+                st.caption(f"Quantised index: {stats['index']}")
         except Exception as e:
             st.error(f"Failed to build index: {e}")
 
@@ -45,17 +48,16 @@ uploaded = st.file_uploader(
 if uploaded:
     docs: List[Tuple[str, str]] = []
     non_official_any = False
-    temp_dir = Path("./.tmp_uploads")
-    temp_dir.mkdir(exist_ok=True)
-    for f in uploaded:
-        temp_path = temp_dir / f.name
-        with open(temp_path, "wb") as out:
-            out.write(f.read())
-        text, _ = extract_text_with_metadata(str(temp_path))
-        is_off, reason = is_official_adgm_format(text)
+    # Parsed from the uploads' bytes (no temp copy); the content-hash cache lets reruns of
+    # this script reuse the parse instead of re-reading the DOCX
+    parsed_docs = parse_documents([(f.name, f.getvalue()) for f in uploaded])
+    for f, parsed in zip(uploaded, parsed_docs):
+        text = parsed.text
+        # Same (text, name) key as the review's scan, so the rule pass is not repeated
+        is_off, reason = is_official_adgm_format(text, f.name)
         if not is_off:
             non_official_any = True
-        docs.append((str(temp_path), text))
+        docs.append((f.name, text))
 
     if non_official_any:
         st.warning(
@@ -65,34 +67,35 @@ if uploaded:
         )
 
     if st.button("Run ADGM Review"):
+        # Issues are rendered as they are found; the full report follows once every file is done
+        st.subheader("Issues")
+        containers = [st.expander(Path(path).name, expanded=True) for path, _text in docs]
+        report = None
         with st.spinner("Analyzing documents with RAG..."):
-            report = analyze_documents(docs)
+            for event in stream_review(docs):
+                if event["event"] == "report":
+                    report = event["report"]
+                    continue
+                issue = event["issue"]
+                line = (
+                    f"**[{issue.get('severity') or 'Medium'}] {issue.get('section_hint') or 'General'}**: "
+                    f"{issue.get('issue', '')}"
+                )
+                if issue.get("suggestion"):
+                    line += f"  \nSuggestion: {issue['suggestion']}"
+                if issue.get("citation"):
+                    line += f"  \nCitation: {issue['citation']}"
+                containers[event["index"]].markdown(line)
         st.subheader("Structured Report")
         st.json(report)
 
-        # Save reviewed docs and provide zip download
-        output_dir = Path(cfg.output_dir)
-        output_dir.mkdir(parents=True, exist_ok=True)
-        reviewed_paths: List[Path] = []
-        for item in report["files"]:
-            in_name = item["file"]
-            for (path, _text) in docs:
-                if Path(path).name == in_name:
-                    reviewed_path = output_dir / f"REVIEWED_{in_name}"
-                    annotate_docx(path, item.get("issues", []), str(reviewed_path))
-                    reviewed_paths.append(reviewed_path)
-                    break
-
-        zip_buf = io.BytesIO()
-        with zipfile.ZipFile(zip_buf, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for p in reviewed_paths:
-                zipf.write(p, arcname=p.name)
-            # Also include the structured JSON report
-            json_bytes = json.dumps(report, indent=2).encode('utf-8')
-            zipf.writestr('report.json', json_bytes)
+        # Annotated documents are written straight into the zip, one at a time, instead of via
+        # outputs/; download_button needs the archive's bytes in memory, so no temp file either
+        zip_file = io.BytesIO()
+        write_review_zip(zip_file, review_items(parsed_docs, report), report)
         st.download_button(
             label="Download Reviewed Docs + Report (ZIP)",
-            data=zip_buf.getvalue(),
+            data=zip_file.getvalue(),
             file_name="adgm_review_outputs.zip",
             mime="application/zip",
         )
@@ -0,0 +1,385 @@
+from __future__ import annotations
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, Tuple
+import os
+import numpy as np
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # argpartition + sort of the k winners instead of a full argsort over every row
+    n = scores.shape[-1]
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(scores.shape[:-1] + (0,), dtype=np.int64)
+    if k < n:
+        part = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    else:
+        part = np.broadcast_to(np.arange(n), scores.shape).copy()
+    order = np.argsort(-np.take_along_axis(scores, part, axis=-1), axis=-1, kind="stable")
+    return np.take_along_axis(part, order, axis=-1)
+
+
+def _matches(data, embeddings: np.ndarray, signature: str) -> bool:
+    # A persisted index belongs to one exact embeddings file: same shape is not enough, since
+    # rows can change while their count stays the same
+    stored = str(data["signature"]) if "signature" in data.files else ""
+    return tuple(data["shape"]) == tuple(embeddings.shape) and stored == signature
+
+
+class ExactIndex:
+    kind = "exact"
+
+    def __init__(self, embeddings: np.ndarray) -> None:
+        self.embeddings = embeddings
+
+    def search(self, queries: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        q = np.atleast_2d(queries).astype(np.float32, copy=False)
+        sims = q @ np.asarray(self.embeddings).T
+        idx = _top_k(sims, k)
+        return idx, np.take_along_axis(sims, idx, axis=-1)
+
+    def save(self, path: Path, signature: str = "") -> None:
+        # Nothing to persist: exact search reads the memory-mapped embeddings directly
+        return None
+
+
+class IVFIndex:
+    # Inverted-file index: vectors are bucketed by their nearest k-means centroid and a
+    # query only scores the vectors in its `nprobe` closest buckets (the recall/latency knob).
+    kind = "ivf"
+
+    def __init__(self, embeddings: np.ndarray, centroids: np.ndarray, list_offsets: np.ndarray,
+                 list_ids: np.ndarray, nprobe: int = 8) -> None:
+        self.embeddings = embeddings
+        self.centroids = centroids
+        self.list_offsets = list_offsets
+        self.list_ids = list_ids
+        self.nprobe = nprobe
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, nlist: int = 0, nprobe: int = 8, iters: int = 10,
+              seed: int = 0, batch_size: int = 65536) -> "IVFIndex":
+        n = embeddings.shape[0]
+        if nlist <= 0:
+            nlist = max(1, int(np.sqrt(n)))
+        nlist = min(nlist, n)
+        rng = np.random.RandomState(seed)
+        # Train on a bounded sample so k-means cost does not grow with the corpus
+        sample_n = min(n, max(nlist * 64, 10000))
+        sample = np.asarray(embeddings[np.sort(rng.choice(n, sample_n, replace=False))], dtype=np.float32)
+        centroids = sample[rng.choice(sample_n, nlist, replace=False)].copy()
+        for _ in range(iters):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_n, int(empty.sum()), replace=False)]
+            centroids = sums / (np.linalg.norm(sums, axis=1, keepdims=True) + 1e-12)
+        assign = np.empty(n, dtype=np.int32)
+        for i in range(0, n, batch_size):
+            block = np.asarray(embeddings[i:i + batch_size], dtype=np.float32)
+            assign[i:i + batch_size] = np.argmax(block @ centroids.T, axis=1)
+        list_ids = np.argsort(assign, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=nlist))]).astype(np.int64)
+        return cls(embeddings, centroids.astype(np.float32), list_offsets, list_ids, nprobe=nprobe)
+
+    def _candidates(self, q: np.ndarray, nprobe: int) -> np.ndarray:
+        probes = _top_k(self.centroids @ q, nprobe)
+        return np.concatenate([self.list_ids[self.list_offsets[c]:self.list_offsets[c + 1]] for c in probes])
+
+    def search(self, queries: np.ndarray, k: int, nprobe: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        q2 = np.atleast_2d(queries).astype(np.float32, copy=False)
+        nprobe = max(1, min(nprobe or self.nprobe, self.centroids.shape[0]))
+        all_idx = np.full((q2.shape[0], k), -1, dtype=np.int64)
+        all_sims = np.full((q2.shape[0], k), -np.inf, dtype=np.float32)
+        for row, q in enumerate(q2):
+            cand = self._candidates(q, nprobe)
+            if not len(cand):
+                continue
+            cand.sort()
+            sims = np.asarray(self.embeddings[cand]) @ q
+            top = _top_k(sims, k)
+            all_idx[row, :len(top)] = cand[top]
+            all_sims[row, :len(top)] = sims[top]
+        return all_idx, all_sims
+
+    def save(self, path: Path, signature: str = "") -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, centroids=self.centroids, list_offsets=self.list_offsets, list_ids=self.list_ids,
+                     shape=np.asarray(self.embeddings.shape, dtype=np.int64), signature=np.asarray(signature))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, embeddings: np.ndarray, nprobe: int = 8, signature: str = "") -> "IVFIndex | None":
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            if not _matches(data, embeddings, signature):
+                return None
+            return cls(embeddings, data["centroids"], data["list_offsets"], data["list_ids"], nprobe=nprobe)
+
+
+def _blocked_top_k(score_block, n: int, n_queries: int, k: int,
+                   block: int = 65536) -> Tuple[np.ndarray, np.ndarray]:
+    # Running top-k over row blocks, so a full (rows x queries) score matrix is never held
+    best_idx = np.empty((n_queries, 0), dtype=np.int64)
+    best_sims = np.empty((n_queries, 0), dtype=np.float32)
+    for i in range(0, n, block):
+        sims = score_block(i, min(n, i + block))  # (queries, rows in block)
+        idx = np.concatenate([best_idx, np.broadcast_to(np.arange(i, i + sims.shape[1]), sims.shape)], axis=1)
+        sims = np.concatenate([best_sims, sims.astype(np.float32, copy=False)], axis=1)
+        top = _top_k(sims, k)
+        best_idx, best_sims = np.take_along_axis(idx, top, axis=1), np.take_along_axis(sims, top, axis=1)
+    return best_idx, best_sims
+
+
+class _QuantizedIndex(ABC):
+    # First pass scores compact codes held in RAM; the best `rerank * k` candidates are then
+    # re-scored exactly against the float32 vectors, which stay memory-mapped on disk (only the
+    # candidate rows are ever paged in). rerank=0 returns the approximate scores as-is.
+    kind = ""
+
+    def __init__(self, embeddings: np.ndarray, rerank: int = 4) -> None:
+        self.embeddings = embeddings
+        self.rerank = rerank
+        self.report: Dict[str, Any] = {}
+
+    @abstractmethod
+    def _scores(self, q: np.ndarray, start: int, end: int) -> np.ndarray:
+        ...
+
+    @property
+    @abstractmethod
+    def code_bytes(self) -> int:
+        ...
+
+    @abstractmethod
+    def save(self, path: Path, signature: str = "") -> None:
+        ...
+
+    def search(self, queries: np.ndarray, k: int, rerank: int | None = None) -> Tuple[np.ndarray, np.ndarray]:
+        q = np.atleast_2d(queries).astype(np.float32, copy=False)
+        n = self.embeddings.shape[0]
+        rerank = self.rerank if rerank is None else rerank
+        n_cand = min(n, max(k, k * rerank))
+        prepared = self._prepare(q)
+        # ~16 MB of float32 per block when int8 codes are widened for the matrix product
+        block = max(1024, (1 << 22) // max(1, self.embeddings.shape[1]))
+        cand, sims = _blocked_top_k(lambda s, e: self._scores(prepared, s, e), n, q.shape[0], n_cand, block)
+        if not rerank:
+            return cand[:, :k], sims[:, :k]
+        all_idx = np.full((q.shape[0], k), -1, dtype=np.int64)
+        all_sims = np.full((q.shape[0], k), -np.inf, dtype=np.float32)
+        for row in range(q.shape[0]):
+            ids = np.sort(cand[row])
+            exact = np.asarray(self.embeddings[ids], dtype=np.float32) @ q[row]
+            top = _top_k(exact, k)
+            all_idx[row, :len(top)] = ids[top]
+            all_sims[row, :len(top)] = exact[top]
+        return all_idx, all_sims
+
+    def _prepare(self, q: np.ndarray):
+        return q
+
+    def evaluate(self, k: int = 10, queries: int = 100, seed: int = 0) -> Dict[str, Any]:
+        # Memory saving and recall@k (with and without re-ranking) against exact search, using
+        # perturbed rows of the corpus itself as queries
+        n, dim = self.embeddings.shape
+        rng = np.random.RandomState(seed)
+        q = np.asarray(self.embeddings[np.sort(rng.choice(n, min(queries, n), replace=False))], dtype=np.float32)
+        q = q + 0.1 * rng.randn(*q.shape).astype(np.float32) / np.sqrt(dim)
+        q /= np.linalg.norm(q, axis=1, keepdims=True) + 1e-12
+        k = min(k, n)
+        exact, _ = _blocked_top_k(lambda s, e: q @ np.asarray(self.embeddings[s:e], dtype=np.float32).T,
+                                  n, q.shape[0], k)
+        float_bytes = n * dim * 4
+        self.report = {
+            "kind": self.kind,
+            "rows": int(n),
+            "float32_mb": round(float_bytes / 1e6, 3),
+            "codes_mb": round(self.code_bytes / 1e6, 3),
+            "compression": round(float_bytes / max(1, self.code_bytes), 1),
+            "rerank": self.rerank,
+            f"recall_at_{k}": round(recall_at_k(self.search(q, k)[0], exact), 4),
+            f"recall_at_{k}_codes_only": round(recall_at_k(self.search(q, k, rerank=0)[0], exact), 4),
+        }
+        return self.report
+
+
+class Int8Index(_QuantizedIndex):
+    # Scalar quantisation: one int8 per dimension with a per-dimension symmetric scale (4x smaller)
+    kind = "int8"
+
+    def __init__(self, embeddings: np.ndarray, codes: np.ndarray, scale: np.ndarray, rerank: int = 4) -> None:
+        super().__init__(embeddings, rerank)
+        self.codes = codes
+        self.scale = scale
+
+    @property
+    def code_bytes(self) -> int:
+        return int(self.codes.nbytes + self.scale.nbytes)
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, rerank: int = 4, batch_size: int = 65536) -> "Int8Index":
+        n, dim = embeddings.shape
+        peak = np.zeros(dim, dtype=np.float32)
+        for i in range(0, n, batch_size):
+            peak = np.maximum(peak, np.abs(np.asarray(embeddings[i:i + batch_size], dtype=np.float32)).max(axis=0))
+        scale = np.where(peak > 0, peak / 127.0, 1.0).astype(np.float32)
+        codes = np.empty((n, dim), dtype=np.int8)
+        for i in range(0, n, batch_size):
+            block = np.asarray(embeddings[i:i + batch_size], dtype=np.float32) / scale
+            codes[i:i + batch_size] = np.clip(np.rint(block), -127, 127)
+        return cls(embeddings, codes, scale, rerank)
+
+    def _prepare(self, q: np.ndarray) -> np.ndarray:
+        return q * self.scale
+
+    def _scores(self, q: np.ndarray, start: int, end: int) -> np.ndarray:
+        return q @ self.codes[start:end].astype(np.float32).T
+
+    def save(self, path: Path, signature: str = "") -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, codes=self.codes, scale=self.scale, shape=np.asarray(self.embeddings.shape, dtype=np.int64), signature=np.asarray(signature))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, embeddings: np.ndarray, rerank: int = 4, signature: str = "") -> "Int8Index | None":
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            if not _matches(data, embeddings, signature):
+                return None
+            return cls(embeddings, data["codes"], data["scale"], rerank)
+
+
+class PQIndex(_QuantizedIndex):
+    # Product quantisation: each vector is cut into `m` sub-vectors and each sub-vector stored as
+    # the uint8 id of its nearest of 256 k-means centroids (m bytes per row). Queries are scored
+    # with per-query lookup tables (asymmetric distance: the query itself is not quantised).
+    kind = "pq"
+
+    def __init__(self, embeddings: np.ndarray, codes: np.ndarray, centroids: np.ndarray, rerank: int = 4) -> None:
+        super().__init__(embeddings, rerank)
+        self.codes = codes            # (n, m) uint8
+        self.centroids = centroids    # (m, ksub, dim // m)
+
+    @property
+    def code_bytes(self) -> int:
+        return int(self.codes.nbytes + self.centroids.nbytes)
+
+    @staticmethod
+    def _subvectors(dim: int, m: int) -> int:
+        # Largest m' <= m that divides dim (default: 8 dimensions per byte)
+        m = m if m > 0 else max(1, dim // 8)
+        m = min(m, dim)
+        while dim % m:
+            m -= 1
+        return m
+
+    @classmethod
+    def build(cls, embeddings: np.ndarray, m: int = 0, rerank: int = 4, iters: int = 8, seed: int = 0,
+              batch_size: int = 65536) -> "PQIndex":
+        n, dim = embeddings.shape
+        m = cls._subvectors(dim, m)
+        sub = dim // m
+        ksub = min(256, n)
+        rng = np.random.RandomState(seed)
+        sample_n = min(n, max(ksub * 40, 10000))
+        sample = np.asarray(embeddings[np.sort(rng.choice(n, sample_n, replace=False))], dtype=np.float32)
+        sample = sample.reshape(sample_n, m, sub)
+        centroids = np.empty((m, ksub, sub), dtype=np.float32)
+        for j in range(m):
+            x = sample[:, j, :]
+            c = x[rng.choice(sample_n, ksub, replace=False)].copy()
+            for _ in range(iters):
+                assign = np.argmax(x @ c.T - 0.5 * (c * c).sum(axis=1), axis=1)
+                sums = np.zeros_like(c)
+                np.add.at(sums, assign, x)
+                counts = np.bincount(assign, minlength=ksub)
+                empty = counts == 0
+                c = sums / np.maximum(counts, 1)[:, None]
+                if empty.any():
+                    c[empty] = x[rng.choice(sample_n, int(empty.sum()), replace=False)]
+            centroids[j] = c
+        codes = np.empty((n, m), dtype=np.uint8)
+        half_norms = 0.5 * (centroids * centroids).sum(axis=2)  # (m, ksub)
+        for i in range(0, n, batch_size):
+            block = np.asarray(embeddings[i:i + batch_size], dtype=np.float32).reshape(-1, m, sub)
+            for j in range(m):
+                codes[i:i + batch_size, j] = np.argmax(block[:, j, :] @ centroids[j].T - half_norms[j], axis=1)
+        return cls(embeddings, codes, centroids, rerank)
+
+    def _prepare(self, q: np.ndarray) -> np.ndarray:
+        # (queries, m, ksub): inner product of each query sub-vector with every centroid
+        m, _, sub = self.centroids.shape
+        return np.einsum("qms,mks->qmk", q.reshape(q.shape[0], m, sub), self.centroids)
+
+    def _scores(self, tables: np.ndarray, start: int, end: int) -> np.ndarray:
+        codes = self.codes[start:end]
+        sims = np.zeros((tables.shape[0], len(codes)), dtype=np.float32)
+        for j in range(codes.shape[1]):
+            sims += tables[:, j, codes[:, j]]
+        return sims
+
+    def save(self, path: Path, signature: str = "") -> None:
+        tmp = path.with_name(path.name + ".tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, codes=self.codes, centroids=self.centroids,
+                     shape=np.asarray(self.embeddings.shape, dtype=np.int64), signature=np.asarray(signature))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path, embeddings: np.ndarray, rerank: int = 4, signature: str = "") -> "PQIndex | None":
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            if not _matches(data, embeddings, signature):
+                return None
+            return cls(embeddings, data["codes"], data["centroids"], rerank)
+
+
+INDEX_KINDS = ("exact", "ivf", "int8", "pq")
+
+
+def index_path(persist_prefix: str, kind: str) -> Path:
+    return Path(f"{persist_prefix}.{kind}.npz")
+
+
+def open_index(persist_prefix: str, embeddings: np.ndarray, kind: str = "exact", nlist: int = 0,
+               nprobe: int = 8, rebuild: bool = False, rerank: int = 4, pq_m: int = 0, signature: str = ""):
+    # Quantised indexes measure their memory saving and recall whenever they are (re)built;
+    # the numbers are on `index.report`. `signature` identifies the embeddings file; a persisted
+    # index written for another one is rebuilt.
+    kind = (kind or "exact").lower()
+    if kind not in INDEX_KINDS:
+        raise ValueError(f"Unknown vector index kind: {kind!r} (expected one of {INDEX_KINDS})")
+    if kind == "exact":
+        return ExactIndex(embeddings)
+    path = index_path(persist_prefix, kind)
+    if kind == "ivf":
+        index = None if rebuild else IVFIndex.load(path, embeddings, nprobe=nprobe, signature=signature)
+        if index is None:
+            index = IVFIndex.build(embeddings, nlist=nlist, nprobe=nprobe)
+            index.save(path, signature)
+        return index
+    cls = Int8Index if kind == "int8" else PQIndex
+    index = None if rebuild else cls.load(path, embeddings, rerank=rerank, signature=signature)
+    if index is None:
+        index = cls.build(embeddings, rerank=rerank) if kind == "int8" else \
+            PQIndex.build(embeddings, m=pq_m, rerank=rerank)
+        index.save(path, signature)
+        index.evaluate()
+    return index
+
+
+def recall_at_k(approx_idx: np.ndarray, exact_idx: np.ndarray) -> float:
+    hits = 0
+    for a, e in zip(np.atleast_2d(approx_idx), np.atleast_2d(exact_idx)):
+        hits += len(set(a.tolist()) & set(e.tolist()))
+    return hits / max(1, exact_idx.size)
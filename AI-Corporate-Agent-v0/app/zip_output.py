@@ -0,0 +1,82 @@
+from __future__ import annotations
+from typing import IO, Any, Dict, Iterable, Iterator, List, Tuple
+import io
+import json
+import zipfile
+
+from app.doc_cache import ParsedDocument
+from app.docx_utils import annotate_docx
+
+REPORT_NAME = "report.json"
+
+
+class ReviewZipWriter:
+    # Reviewed documents are annotated straight into their zip entry as each one is added, so
+    # nothing is staged under outputs/ and only the document being written is held in memory.
+    # Works on any binary file object, including non-seekable ones (data descriptors are used).
+    def __init__(self, fileobj: IO[bytes]) -> None:
+        self._zip = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED)
+
+    def add_reviewed(self, parsed: ParsedDocument, issues: List[Dict[str, Any]], name: str | None = None) -> None:
+        # .docx is already a deflated zip; storing it avoids compressing it twice
+        info = zipfile.ZipInfo(f"REVIEWED_{name or parsed.name}")
+        info.compress_type = zipfile.ZIP_STORED
+        with self._zip.open(info, "w") as entry:
+            annotate_docx(parsed.name, issues, entry, parsed=parsed)
+
+    def add_report(self, report: Dict[str, Any]) -> None:
+        self._zip.writestr(REPORT_NAME, json.dumps(report, indent=2).encode("utf-8"))
+
+    def close(self) -> None:
+        self._zip.close()
+
+    def __enter__(self) -> "ReviewZipWriter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+
+class _ChunkSink(io.RawIOBase):
+    # Write-only, non-seekable buffer drained by iter_review_zip after every entry
+    def __init__(self) -> None:
+        self._chunks: List[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> Iterator[bytes]:
+        chunks, self._chunks = self._chunks, []
+        if chunks:
+            yield b"".join(chunks)
+
+
+def write_review_zip(fileobj: IO[bytes], items: Iterable[Tuple[ParsedDocument, List[Dict[str, Any]]]],
+                     report: Dict[str, Any]) -> None:
+    with ReviewZipWriter(fileobj) as writer:
+        for parsed, issues in items:
+            writer.add_reviewed(parsed, issues)
+        writer.add_report(report)
+
+
+def iter_review_zip(items: Iterable[Tuple[ParsedDocument, List[Dict[str, Any]]]],
+                    report: Dict[str, Any]) -> Iterator[bytes]:
+    # The archive as a byte stream (one chunk per entry) for HTTP streaming responses
+    sink = _ChunkSink()
+    writer = ReviewZipWriter(sink)
+    for parsed, issues in items:
+        writer.add_reviewed(parsed, issues)
+        yield from sink.drain()
+    writer.add_report(report)
+    writer.close()
+    yield from sink.drain()
+
+
+def review_items(parsed: List[ParsedDocument], report: Dict[str, Any]) -> Iterator[Tuple[ParsedDocument, List[Dict[str, Any]]]]:
+    # Pairs parsed uploads with their report entries (report["files"] follows upload order)
+    for doc, item in zip(parsed, report["files"]):
+        yield doc, item.get("issues", [])
@@ -0,0 +1,86 @@
+from __future__ import annotations
+import argparse
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import List, Dict, Any
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+
+from app.vector_index import ExactIndex, IVFIndex, recall_at_k
+
+
+def synthetic_embeddings(n: int, dim: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    # Clustered unit vectors roughly mimic chunk embeddings of a topical corpus
+    rng = np.random.RandomState(seed)
+    centers = rng.randn(clusters, dim).astype(np.float32)
+    arr = centers[rng.randint(0, clusters, n)] + 0.6 * rng.randn(n, dim).astype(np.float32)
+    return arr / (np.linalg.norm(arr, axis=1, keepdims=True) + 1e-12)
+
+
+def run(n: int, dim: int, queries: int, k: int, nlist: int, nprobes: List[int]) -> Dict[str, Any]:
+    emb = synthetic_embeddings(n, dim)
+    rng = np.random.RandomState(1)
+    q = emb[rng.choice(n, queries, replace=False)] + 0.1 * rng.randn(queries, dim).astype(np.float32)
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+
+    exact = ExactIndex(emb)
+    t0 = time.perf_counter()
+    exact_idx = np.vstack([exact.search(v, k)[0] for v in q])
+    exact_ms = (time.perf_counter() - t0) * 1000 / queries
+
+    t0 = time.perf_counter()
+    ivf = IVFIndex.build(emb, nlist=nlist)
+    build_s = time.perf_counter() - t0
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "bench.ivf.npz"
+        ivf.save(path)
+        index_bytes = path.stat().st_size
+
+    rows = []
+    for nprobe in nprobes:
+        t0 = time.perf_counter()
+        approx_idx = np.vstack([ivf.search(v, k, nprobe=nprobe)[0] for v in q])
+        ms = (time.perf_counter() - t0) * 1000 / queries
+        rows.append({
+            "nprobe": nprobe,
+            "recall_at_k": round(recall_at_k(approx_idx, exact_idx), 4),
+            "latency_ms": round(ms, 3),
+            "speedup": round(exact_ms / ms, 2) if ms else None,
+        })
+    return {
+        "n": n, "dim": dim, "k": k, "queries": queries,
+        "nlist": int(ivf.centroids.shape[0]),
+        "ivf_build_s": round(build_s, 3),
+        "ivf_index_bytes": index_bytes,
+        "exact_latency_ms": round(exact_ms, 3),
+        "ivf": rows,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="recall@k and latency of the IVF index vs exact search")
+    ap.add_argument("--n", type=int, default=100_000)
+    ap.add_argument("--dim", type=int, default=384)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--k", type=int, default=6)
+    ap.add_argument("--nlist", type=int, default=0)
+    ap.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    ap.add_argument("--out", type=str, default="")
+    args = ap.parse_args()
+    result = run(args.n, args.dim, args.queries, args.k, args.nlist, args.nprobe)
+    text = json.dumps(result, indent=2)
+    if args.out:
+        Path(args.out).write_text(text, encoding="utf-8")
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
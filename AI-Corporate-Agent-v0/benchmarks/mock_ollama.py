@@ -0,0 +1,118 @@
+from __future__ import annotations
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+import hashlib
+import json
+import threading
+import time
+import numpy as np
+
+
+CHAT_REPLY = json.dumps([
+    {
+        "section_hint": "Jurisdiction",
+        "issue": "Governing law clause does not reference ADGM Courts",
+        "severity": "High",
+        "suggestion": "Refer disputes to the ADGM Courts.",
+        "citation": "ADGM Companies Regulations 2020",
+    },
+    {
+        "section_hint": "Execution",
+        "issue": "Resolution is not dated",
+        "severity": "Medium",
+        "suggestion": "Add the date of the resolution.",
+        "citation": "ADGM model resolution template",
+    },
+])
+
+
+def fake_embedding(text: str, dim: int) -> list:
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:4], "little")
+    return np.random.RandomState(seed).rand(dim).astype(np.float32).tolist()
+
+
+class MockOllamaServer:
+    # Local stand-in for Ollama's embedding endpoints. Each request costs `request_latency`
+    # seconds plus `item_latency` per embedded text, which is roughly how a real server behaves.
+    def __init__(self, request_latency: float = 0.02, item_latency: float = 0.002, dim: int = 384,
+                 batch_endpoint: bool = True, chat_latency: float = 0.0, chat_reply: str = CHAT_REPLY) -> None:
+        self.request_latency = request_latency
+        self.item_latency = item_latency
+        self.dim = dim
+        self.batch_endpoint = batch_endpoint
+        self.chat_latency = chat_latency
+        self.chat_reply = chat_reply
+        self.requests = 0
+        self._server: ThreadingHTTPServer | None = None
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args) -> None:
+                return None
+
+            def _reply(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream_chat(self, payload: dict) -> None:
+                # NDJSON like Ollama: the reply is spread evenly over chat_latency in small pieces
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.end_headers()
+                reply = mock.chat_reply
+                pieces = [reply[i:i + 16] for i in range(0, len(reply), 16)] or [""]
+                for piece in pieces:
+                    time.sleep(mock.chat_latency / len(pieces))
+                    line = {"model": payload.get("model"), "done": False,
+                            "message": {"role": "assistant", "content": piece}}
+                    self.wfile.write((json.dumps(line) + "\n").encode("utf-8"))
+                    self.wfile.flush()
+                self.wfile.write((json.dumps({"model": payload.get("model"), "done": True}) + "\n").encode("utf-8"))
+                self.close_connection = True
+
+            def do_POST(self) -> None:
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                mock.requests += 1
+                if self.path == "/api/embed" and mock.batch_endpoint:
+                    inputs = payload.get("input") or []
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    time.sleep(mock.request_latency + mock.item_latency * len(inputs))
+                    self._reply(200, {"embeddings": [fake_embedding(t, mock.dim) for t in inputs]})
+                elif self.path == "/api/embeddings":
+                    time.sleep(mock.request_latency + mock.item_latency)
+                    self._reply(200, {"embedding": fake_embedding(payload.get("prompt", ""), mock.dim)})
+                elif self.path == "/api/chat" and payload.get("stream", True):
+                    self._stream_chat(payload)
+                elif self.path == "/api/chat":
+                    time.sleep(mock.chat_latency)
+                    self._reply(200, {"model": payload.get("model"), "done": True,
+                                      "message": {"role": "assistant", "content": mock.chat_reply}})
+                else:
+                    self._reply(404, {"error": "404 page not found"})
+
+        return Handler
+
+    def start(self) -> str:
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> str:
+        return self.start()
+
+    def __exit__(self, *exc: Tuple) -> None:
+        self.stop()
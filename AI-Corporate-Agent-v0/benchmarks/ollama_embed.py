@@ -0,0 +1,63 @@
+from __future__ import annotations
+import argparse
+import json
+import time
+from typing import List, Dict, Any
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import httpx
+import numpy as np
+
+from app.ollama_embed import OllamaEmbedder
+from benchmarks.mock_ollama import MockOllamaServer
+
+
+def sequential_embed(texts: List[str], base_url: str, model: str) -> np.ndarray:
+    # The previous implementation: one /api/embeddings request per text, one after another
+    vecs = []
+    with httpx.Client(timeout=120) as client:
+        for t in texts:
+            r = client.post(f"{base_url}/api/embeddings", json={"model": model, "prompt": t})
+            r.raise_for_status()
+            vecs.append(r.json()["embedding"])
+    return np.asarray(vecs, dtype=np.float32)
+
+
+def run(n: int, batch_size: int, concurrency: int, request_latency: float, item_latency: float) -> Dict[str, Any]:
+    texts = [f"ADGM reference chunk {i} " + "lorem ipsum " * 50 for i in range(n)]
+    result: Dict[str, Any] = {"texts": n, "batch_size": batch_size, "concurrency": concurrency,
+                              "request_latency_s": request_latency, "item_latency_s": item_latency}
+    with MockOllamaServer(request_latency, item_latency) as url:
+        t0 = time.perf_counter()
+        sequential_embed(texts, url, "mock")
+        result["sequential_s"] = round(time.perf_counter() - t0, 3)
+
+        t0 = time.perf_counter()
+        OllamaEmbedder(url, "mock", batch_size=batch_size, concurrency=concurrency).embed(texts)
+        result["batched_concurrent_s"] = round(time.perf_counter() - t0, 3)
+    with MockOllamaServer(request_latency, item_latency, batch_endpoint=False) as url:
+        t0 = time.perf_counter()
+        OllamaEmbedder(url, "mock", batch_size=batch_size, concurrency=concurrency).embed(texts)
+        result["concurrent_single_endpoint_s"] = round(time.perf_counter() - t0, 3)
+    result["speedup"] = round(result["sequential_s"] / result["batched_concurrent_s"], 2)
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Ollama embedding throughput against a local mock server")
+    ap.add_argument("--n", type=int, default=500)
+    ap.add_argument("--batch-size", type=int, default=32)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--request-latency", type=float, default=0.02)
+    ap.add_argument("--item-latency", type=float, default=0.002)
+    args = ap.parse_args()
+    print(json.dumps(run(args.n, args.batch_size, args.concurrency, args.request_latency, args.item_latency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
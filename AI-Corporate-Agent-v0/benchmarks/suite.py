@@ -0,0 +1,252 @@
+from __future__ import annotations
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import numpy as np
+
+from benchmarks.mock_ollama import MockOllamaServer
+from benchmarks.synthetic import sentence, write_bundle, write_docx, write_reference_corpus
+
+# End-to-end benchmarks against a local mock Ollama (embeddings + chat), so results depend only
+# on this code and machine. Results are written as JSON for `compare`:
+#   python -m benchmarks.suite run --sizes 10000,100000 --out results/base.json
+#   python -m benchmarks.suite compare results/base.json results/new.json
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def _latency(samples: List[float]) -> Dict[str, float]:
+    ms = np.asarray(samples) * 1000
+    return {"p50_ms": round(float(np.percentile(ms, 50)), 3), "p99_ms": round(float(np.percentile(ms, 99)), 3),
+            "mean_ms": round(float(ms.mean()), 3)}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def _dir_mb(prefix: Path) -> float:
+    return round(sum(p.stat().st_size for p in prefix.parent.glob(prefix.name + ".*")) / 1e6, 3)
+
+
+def bench_ingest_and_retrieval(workdir: Path, sizes: List[int], queries: int, k: int) -> List[Dict[str, Any]]:
+    from app.ingest import VectorStore
+
+    results: List[Dict[str, Any]] = []
+    qrng = random.Random(9)
+    query_texts = [sentence(qrng, 10) for _ in range(queries)]
+    for n in sizes:
+        ref = workdir / f"ref_{n}"
+        write_reference_corpus(str(ref), n)
+        prefix = workdir / f"index_{n}" / "vector"
+        prefix.parent.mkdir(parents=True, exist_ok=True)
+        vs = VectorStore(str(prefix))
+        rss0 = _rss_mb()
+        t0 = time.perf_counter()
+        stats = vs.build_from_directory(str(ref))
+        build_s = time.perf_counter() - t0
+        results.append({
+            "bench": "ingest", "params": {"chunks": n},
+            "metrics": {"seconds": round(build_s, 3), "chunks": len(vs.texts),
+                        "chunks_per_s": round(len(vs.texts) / build_s, 1),
+                        "rss_delta_mb": round(_rss_mb() - rss0, 1), "index_mb": _dir_mb(prefix),
+                        "files": stats.get("embedded", 0)},
+        })
+        for mode in ("dense", "hybrid", "lexical"):
+            vs.similarity_search_batch(query_texts[:1], k=k, mode=mode)  # warm (index/BM25 load)
+            samples = []
+            for q in query_texts:
+                t0 = time.perf_counter()
+                vs.similarity_search_batch([q], k=k, mode=mode)
+                samples.append(time.perf_counter() - t0)
+            results.append({"bench": "search", "params": {"chunks": n, "mode": mode, "k": k},
+                            "metrics": {**_latency(samples), "rss_mb": round(_rss_mb(), 1)}})
+        # Batched clause-style retrieval: one embedding call + one matrix product for 24 queries
+        samples = []
+        for i in range(0, min(queries, 240), 24):
+            t0 = time.perf_counter()
+            vs.similarity_search_batch(query_texts[i:i + 24], k=3)
+            samples.append(time.perf_counter() - t0)
+        results.append({"bench": "search_batch", "params": {"chunks": n, "batch": 24, "k": 3},
+                        "metrics": _latency(samples)})
+        del vs
+        shutil.rmtree(ref, ignore_errors=True)
+    return results
+
+
+def bench_review(workdir: Path, bundle_sizes: List[int], paragraphs: int, repeats: int) -> List[Dict[str, Any]]:
+    from app.analyzer import analyze_documents
+    from app.doc_cache import DocumentCache
+
+    results: List[Dict[str, Any]] = []
+    for n_docs in bundle_sizes:
+        paths = write_bundle(str(workdir / f"bundle_{n_docs}"), n_docs, paragraphs)
+        walls = []
+        timing: Dict[str, Any] = {}
+        for _ in range(repeats):
+            cache = DocumentCache(memory_items=0)  # measure real extraction every repeat
+            t0 = time.perf_counter()
+            docs = [(p, cache.parse(p).text) for p in paths]
+            report = analyze_documents(docs)
+            walls.append(time.perf_counter() - t0)
+            timing = report.get("timing", {})
+        stages = {name: s["total_ms"] for name, s in timing.get("stages", {}).items()}
+        results.append({"bench": "review", "params": {"documents": n_docs, "paragraphs": paragraphs},
+                        "metrics": {**_latency(walls), "stages_ms": stages,
+                                    "dropped_issues": len(timing.get("dropped_issues", []))}})
+    return results
+
+
+def bench_annotate(workdir: Path, paragraph_sizes: List[int], issues: int) -> List[Dict[str, Any]]:
+    from app.doc_cache import DocumentCache
+    from app.docx_utils import annotate_docx
+
+    results: List[Dict[str, Any]] = []
+    issue_list = [
+        {"section_hint": hint, "issue": f"Synthetic issue {i}", "suggestion": "Fix it.", "citation": "ADGM"}
+        for i, hint in enumerate((["Dubai Courts", "best efforts", "Registration Authority", "quorum"] * issues)[:issues])
+    ]
+    for n in paragraph_sizes:
+        src = write_docx(str(workdir / f"annotate_{n}.docx"), "Articles of Association", n)
+        parsed = DocumentCache(memory_items=4).parse(src)
+        t0 = time.perf_counter()
+        annotate_docx(src, issue_list, str(workdir / f"annotated_{n}.docx"), parsed=parsed)
+        seconds = time.perf_counter() - t0
+        results.append({"bench": "annotate", "params": {"paragraphs": n, "issues": issues},
+                        "metrics": {"seconds": round(seconds, 4),
+                                    "ms_per_1k_paragraphs": round(seconds * 1e6 / max(n, 1), 3),
+                                    "docx_kb": round(Path(src).stat().st_size / 1e3, 1)}})
+    return results
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    workdir = Path(tempfile.mkdtemp(prefix="adgm_bench_"))
+    with MockOllamaServer(request_latency=args.request_latency, item_latency=args.item_latency,
+                          chat_latency=args.chat_latency) as url:
+        # Everything goes to the mock; nothing is read from or written to the user's data/ dir
+        os.environ.update({
+            "OPENAI_API_KEY": "", "OLLAMA_BASE_URL": url, "EMBEDDING_MODEL": "ollama:mock",
+            "OLLAMA_MODEL": "mock", "EMBEDDING_CACHE_PATH": "", "LLM_CACHE_TTL": "0",
+            "VECTOR_DB_PATH": str(workdir / "review_index" / "vector"),
+            "REFERENCE_DIR": str(workdir / "review_ref"), "TRACE_PATH": "",
+        })
+        results: List[Dict[str, Any]] = []
+        benches: Dict[str, Callable[[], List[Dict[str, Any]]]] = {
+            "ingest": lambda: bench_ingest_and_retrieval(workdir, args.sizes, args.queries, args.k),
+            "review": lambda: bench_review(workdir, args.bundles, args.bundle_paragraphs, args.repeats),
+            "annotate": lambda: bench_annotate(workdir, args.paragraphs, args.issues),
+        }
+        try:
+            if "review" in args.only:
+                write_reference_corpus(str(workdir / "review_ref"), 500)
+                from app.ingest import ensure_index
+                ensure_index()
+            for name, fn in benches.items():
+                if name in args.only:
+                    t0 = time.perf_counter()
+                    results.extend(fn())
+                    print(f"{name}: {time.perf_counter() - t0:.1f}s", file=sys.stderr, flush=True)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+
+def _key(result: Dict[str, Any]) -> str:
+    return result["bench"] + " " + json.dumps(result["params"], sort_keys=True)
+
+
+def compare(base: Dict[str, Any], new: Dict[str, Any]) -> List[Dict[str, Any]]:
+    # Relative change of every shared numeric metric (positive = larger in `new`)
+    old = {_key(r): r["metrics"] for r in base["results"]}
+    rows = []
+    for r in new["results"]:
+        before = old.get(_key(r))
+        if before is None:
+            continue
+        for metric, value in r["metrics"].items():
+            prev = before.get(metric)
+            if isinstance(value, (int, float)) and isinstance(prev, (int, float)) and prev:
+                rows.append({"bench": _key(r), "metric": metric, "base": prev, "new": value,
+                             "change_pct": round((value - prev) / prev * 100, 1)})
+    return rows
+
+
+def _ints(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v]
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Reproducible ingestion / retrieval / review benchmarks")
+    sub = ap.add_subparsers(dest="command", required=True)
+    r = sub.add_parser("run")
+    r.add_argument("--sizes", type=_ints, default=[10000, 100000], help="Corpus sizes in chunks (e.g. 10000,100000,1000000)")
+    r.add_argument("--queries", type=int, default=200)
+    r.add_argument("--k", type=int, default=6)
+    r.add_argument("--bundles", type=_ints, default=[1, 5, 10], help="Documents per review bundle")
+    r.add_argument("--bundle-paragraphs", type=int, default=60)
+    r.add_argument("--repeats", type=int, default=3)
+    r.add_argument("--paragraphs", type=_ints, default=[100, 1000, 10000], help="Paragraphs per annotated document")
+    r.add_argument("--issues", type=int, default=20)
+    r.add_argument("--request-latency", type=float, default=0.0)
+    r.add_argument("--item-latency", type=float, default=0.0)
+    r.add_argument("--chat-latency", type=float, default=0.2)
+    r.add_argument("--only", type=lambda v: v.split(","), default=["ingest", "review", "annotate"])
+    r.add_argument("--out", default="", help="Write results JSON here (default: stdout)")
+    c = sub.add_parser("compare")
+    c.add_argument("base")
+    c.add_argument("new")
+    c.add_argument("--threshold", type=float, default=10.0, help="Only show changes of at least this many percent")
+    args = ap.parse_args()
+
+    if args.command == "compare":
+        rows = compare(json.loads(Path(args.base).read_text()), json.loads(Path(args.new).read_text()))
+        for row in rows:
+            if abs(row["change_pct"]) >= args.threshold:
+                print(f"{row['change_pct']:+7.1f}%  {row['bench']}  {row['metric']}: {row['base']} -> {row['new']}")
+        return
+    output = json.dumps(run(args), indent=2)
+    if args.out:
+        Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+        Path(args.out).write_text(output, encoding="utf-8")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+from __future__ import annotations
+from pathlib import Path
+from typing import List
+import random
+
+from docx import Document  # type: ignore
+
+# Deterministic synthetic inputs for the benchmark suite: reference corpora sized in chunks and
+# DOCX bundles sized in paragraphs. Text is built from a legal-flavoured vocabulary so BM25,
+# the rule engine and the annotation matcher see realistic token and hit distributions.
+
+VOCAB = (
+    "company shall director shareholder resolution register members articles association memorandum "
+    "registered office ADGM Abu Dhabi Global Market Registration Authority Companies Regulations "
+    "beneficial owner declaration incorporation application capital share class transfer notice "
+    "meeting quorum vote proxy dividend auditor accounts filing fee licence jurisdiction court "
+    "arbitration governing law obligation indemnity liability breach termination amendment clause "
+    "schedule appendix definition interpretation signatory execution witness seal date party"
+).split()
+
+RED_FLAGS = ["Dubai Courts", "best efforts", "UAE Federal Courts", "may at its discretion"]
+DOC_KINDS = [
+    "Articles of Association",
+    "Memorandum of Association",
+    "Board Resolution",
+    "Shareholder Resolution",
+    "Register of Members and Directors",
+    "Incorporation Application Form",
+    "UBO Declaration",
+    "Change of Registered Address Notice",
+]
+
+
+def sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(VOCAB) for _ in range(words)).capitalize() + "."
+
+
+def paragraph(rng: random.Random, sentences: int = 4) -> str:
+    return " ".join(sentence(rng, rng.randint(8, 20)) for _ in range(sentences))
+
+
+def write_reference_corpus(directory: str, n_chunks: int, chunk_size: int = 1200,
+                           chunks_per_file: int = 50, seed: int = 7) -> List[str]:
+    # ~n_chunks chunks once split at chunk_size (paragraphs are about a chunk each)
+    rng = random.Random(seed)
+    out = Path(directory)
+    out.mkdir(parents=True, exist_ok=True)
+    paths: List[str] = []
+    for f in range(max(1, -(-n_chunks // chunks_per_file))):
+        count = min(chunks_per_file, n_chunks - f * chunks_per_file)
+        parts = []
+        for c in range(max(1, count)):
+            text = f"Section {f}.{c}. " + paragraph(rng, 6)
+            while len(text) < chunk_size - 200:
+                text += " " + paragraph(rng, 2)
+            parts.append(text[:chunk_size - 100])
+        path = out / f"reference_{f:06d}.txt"
+        path.write_text("\n\n".join(parts), encoding="utf-8")
+        paths.append(str(path))
+    return paths
+
+
+def write_docx(path: str, kind: str, paragraphs: int, seed: int = 11) -> str:
+    # One document of the given kind: title, ADGM header, numbered clauses split over several
+    # runs, a sprinkling of red-flag phrases and an execution block
+    rng = random.Random(seed)
+    doc = Document()
+    doc.add_heading(kind, level=1)
+    doc.add_paragraph("Abu Dhabi Global Market (ADGM) - Registration Authority")
+    for i in range(paragraphs):
+        p = doc.add_paragraph()
+        p.add_run(f"{i + 1}. ")
+        text = paragraph(rng, rng.randint(1, 3))
+        if rng.random() < 0.05:
+            text += f" Disputes are referred to the {rng.choice(RED_FLAGS)}."
+        cut = rng.randint(1, max(1, len(text) - 1))
+        p.add_run(text[:cut])
+        p.add_run(text[cut:]).italic = True
+    doc.add_paragraph("Signed by: Director, Authorised Signatory")
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    doc.save(path)
+    return path
+
+
+def write_bundle(directory: str, n_docs: int, paragraphs: int = 60, seed: int = 3) -> List[str]:
+    return [
+        write_docx(str(Path(directory) / f"{i:02d}_{DOC_KINDS[i % len(DOC_KINDS)].replace(' ', '_')}.docx"),
+                   DOC_KINDS[i % len(DOC_KINDS)], paragraphs, seed + i)
+        for i in range(n_docs)
+    ]